@@ -0,0 +1,162 @@
+"""
+Random access to the activities of large files.
+
+`build_index` scans a file's bytes once for the offsets of its `<iati-activity>` elements,
+recording each activity's `iati-identifier` and `reporting-org/@ref`,
+and saves them alongside it (`<file>.index.json`).
+`get_activity` then reads and parses only the one activity asked for:
+
+>>> activity = get_activity("big-publisher.xml", "AA-AAA-123456789-ABC123")
+
+An index is rebuilt when its file's size or modification time has changed.
+"""
+from __future__ import annotations
+
+import html
+import mmap
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import xml_backend
+from activity.models import IatiActivity
+from pydantic import BaseModel
+
+INDEX_VERSION = 1
+
+# Comments and CDATA sections are matched only to be skipped over
+TOKENS = re.compile(rb"<!--.*?-->|<!\[CDATA\[.*?\]\]>|<(/?)iati-activity(?=[\s/>])[^>]*?(/?)>", re.DOTALL)
+ROOT = re.compile(rb"<iati-activities(?=[\s/>])[^>]*>")
+NAMESPACE = re.compile(rb"""\sxmlns(?::([\w.-]+))?\s*=\s*(["'])(.*?)\2""")
+ENCODING = re.compile(rb"""^\s*<\?xml[^>]*?encoding\s*=\s*(["'])([\w.-]+)\1""")
+IDENTIFIER = re.compile(rb"<iati-identifier(?:\s[^>]*)?>(.*?)</iati-identifier\s*>", re.DOTALL)
+REPORTING_ORG_REF = re.compile(rb"""<reporting-org\s[^>]*?\bref\s*=\s*(["'])(.*?)\1""", re.DOTALL)
+
+
+class IndexedActivity(BaseModel):
+    identifier: Optional[str]
+    reporting_org: Optional[str]
+    offset: int
+    length: int
+
+
+class ActivityIndex(BaseModel):
+    """
+    The byte offsets of the activities in a file, and what is needed to parse them on their own
+    """
+
+    version: int = INDEX_VERSION
+    size: int
+    mtime_ns: int
+    encoding: str
+    # The namespace declarations of the root element, by prefix ("" for the default namespace)
+    namespaces: Dict[str, str] = {}
+    activities: List[IndexedActivity] = []
+
+    def find(self, identifier: str, reporting_org: Optional[str] = None) -> List[IndexedActivity]:
+        return [a for a in self.activities if a.identifier == identifier and (reporting_org is None or a.reporting_org == reporting_org)]
+
+    def is_current(self, path: Union[str, os.PathLike]) -> bool:
+        stat = os.stat(path)
+        return self.version == INDEX_VERSION and self.size == stat.st_size and self.mtime_ns == stat.st_mtime_ns
+
+
+def index_path(path: Union[str, os.PathLike]) -> Path:
+    return Path(f"{os.fspath(path)}.index.json")
+
+
+def _text(match: Optional[re.Match], group: int, encoding: str) -> Optional[str]:
+    if match is None:
+        return None
+    return html.unescape(match.group(group).decode(encoding)).strip()
+
+
+def build_index(path: Union[str, os.PathLike], save: bool = True) -> ActivityIndex:
+    """
+    Scan a file for its activities, saving the index alongside it
+    """
+    stat = os.stat(path)
+    index = ActivityIndex(size=stat.st_size, mtime_ns=stat.st_mtime_ns, encoding="utf-8")
+    with open(path, "rb") as source:
+        if stat.st_size:
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                _scan(content, index)
+    if save:
+        index_path(path).write_text(index.json())
+    return index
+
+
+def _scan(content: mmap.mmap, index: ActivityIndex):
+    declaration = ENCODING.match(content[:200])
+    if declaration:
+        index.encoding = declaration.group(2).decode("ascii").lower()
+    if index.encoding.startswith("utf-16") or index.encoding.startswith("utf-32"):
+        raise ValueError(f"Cannot index a file in {index.encoding}")
+
+    root = ROOT.search(content)
+    if root:
+        for prefix, _, uri in NAMESPACE.findall(root.group(0)):
+            index.namespaces[(prefix or b"").decode(index.encoding)] = uri.decode(index.encoding)
+
+    start = None
+    for token in TOKENS.finditer(content, root.end() if root else 0):
+        closing, empty = token.group(1), token.group(2)
+        if closing is None:
+            # A comment or CDATA section
+            continue
+        if not closing and not empty:
+            start = token.start()
+            continue
+        if empty:
+            start = token.start()
+        if start is None:
+            continue
+        element = content[start : token.end()]
+        index.activities.append(
+            IndexedActivity(
+                identifier=_text(IDENTIFIER.search(element), 1, index.encoding),
+                reporting_org=_text(REPORTING_ORG_REF.search(element), 2, index.encoding),
+                offset=start,
+                length=token.end() - start,
+            )
+        )
+        start = None
+
+
+def load_index(path: Union[str, os.PathLike]) -> ActivityIndex:
+    """
+    The saved index of a file, (re)building it if it is missing or out of date
+    """
+    saved = index_path(path)
+    if saved.exists():
+        index = ActivityIndex.parse_file(saved)
+        if index.is_current(path):
+            return index
+    return build_index(path)
+
+
+def read_activity(path: Union[str, os.PathLike], index: ActivityIndex, entry: IndexedActivity, **options) -> IatiActivity:
+    """
+    Parse one indexed activity. It is wrapped in a root element with the file's
+    namespace declarations, so that any prefixed elements and attributes in it still resolve
+    """
+    with open(path, "rb") as source:
+        with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            element = content[entry.offset : entry.offset + entry.length]
+    declarations = "".join(f' xmlns{":" + prefix if prefix else ""}="{html.escape(uri)}"' for prefix, uri in index.namespaces.items())
+    document = f'<?xml version="1.0" encoding="{index.encoding}"?><iati-activities{declarations}>'.encode(index.encoding) + element + b"</iati-activities>"
+    return IatiActivity.from_element(xml_backend.fromstring(document)[0], **options)
+
+
+def get_activity(path: Union[str, os.PathLike], identifier: str, reporting_org: Optional[str] = None, **options) -> Optional[IatiActivity]:
+    """
+    Parse the activity with an `iati-identifier` (and `reporting-org/@ref`, if given) from a file,
+    using its index. Returns None if there is no such activity; if there are several, the first.
+    `options` are passed to `IatiActivity.from_element`
+    """
+    index = load_index(path)
+    found = index.find(identifier, reporting_org)
+    if not found:
+        return None
+    return read_activity(path, index, found[0], **options)
@@ -1,13 +1,20 @@
 from datetime import date, datetime
 from decimal import Decimal
 from enum import Enum, IntEnum
-from typing import List, Optional
+from os import PathLike
+from typing import IO, Iterable, List, Optional, Union
 
+import httpx
 from base_models import (
+    AsyncElementStream,
     CodelistValue,
     DecimalText,
+    ElementStream,
+    ElementWriter,
+    FlyweightModel,
     IatiVersionEnum,
     Narrative,
+    RecordModel,
     TextField,
     ThisElementTextField,
     XmlBaseModel,
@@ -19,15 +26,15 @@ from typing_extensions import Annotated
 
 
 class ChannelCode(CodelistValue):
-    pass
+    codelist = "CRSChannelCode"
 
 
 class RecipientCountryCode(CodelistValue):
-    pass
+    codelist = "Country"
 
 
 class LocationReachCode(CodelistValue):
-    pass
+    codelist = "GeographicLocationReach"
 
 
 class ActivityId(CodelistValue):
@@ -39,18 +46,18 @@ class OrganisationId(CodelistValue):
 
 
 class CollaborationTypeCode(CodelistValue):
-    pass
+    codelist = "CollaborationType"
 
 
 class DocumentCategoryCode(CodelistValue):
-    pass
+    codelist = "DocumentCategory"
 
 
 class LanguageCode(CodelistValue):
-    pass
+    codelist = "Language"
 
 
-class IsoDateModel(XmlBaseModel):
+class IsoDateModel(FlyweightModel):
     """
     For models which have an "iso-date" element
     """
@@ -88,7 +95,7 @@ class CommentNarratives(Narratives):
     narrative: List[Narrative]
 
 
-class ParticipatingOrg(XmlBaseModel):
+class ParticipatingOrg(FlyweightModel):
     class OrganisationTypeCode(IntEnum):
         Government = 10
         Local_Government = 11
@@ -177,7 +184,7 @@ class ActivityDate(XmlBaseModel):
     narrative: List[Narrative]
 
 
-class ActivityStatus(XmlBaseModel):
+class ActivityStatus(FlyweightModel):
     class ActivityStatusCodeEnum(Enum):
         Pipeline_identification = "1"
         Implementation = "2"
@@ -247,7 +254,7 @@ class PolicyMarker(XmlBaseModel):
     significance: Optional[str]
 
 
-class OtherFlags(XmlBaseModel):
+class OtherFlags(FlyweightModel):
     """
     This covers the four CRS++ columns titled: "Free standing technical cooperation"; "Programme-based approach"; "Investment project"; "Associated financing"
     """
@@ -256,15 +263,15 @@ class OtherFlags(XmlBaseModel):
     significance: bool
 
 
-class RepaymentPlan(XmlBaseModel):
+class RepaymentPlan(FlyweightModel):
     code: str
 
 
-class RepaymentType(XmlBaseModel):
+class RepaymentType(FlyweightModel):
     code: str
 
 
-class ActivityScope(XmlBaseModel):
+class ActivityScope(FlyweightModel):
     code: str
 
 
@@ -310,11 +317,11 @@ class RecipientCountry(XmlBaseModel):
     percentage: Optional[Decimal]
 
 
-class LocationReach(XmlBaseModel):
+class LocationReach(FlyweightModel):
     code: LocationReachCode
 
 
-class LocationId(XmlBaseModel):
+class LocationId(FlyweightModel):
     code: str
     vocabulary: str
 
@@ -334,7 +341,7 @@ class Administrative(XmlBaseModel):
     level: str
 
 
-class LocationClass(XmlBaseModel):
+class LocationClass(FlyweightModel):
     code: str
 
 
@@ -350,11 +357,11 @@ class LocationActivityDescription(XmlBaseModel):
     narrative: List[Narrative]
 
 
-class LocationExactness(XmlBaseModel):
+class LocationExactness(FlyweightModel):
     code: str
 
 
-class LocationFeatureDesignation(XmlBaseModel):
+class LocationFeatureDesignation(FlyweightModel):
     code: str
 
 
@@ -374,20 +381,20 @@ class Location(XmlBaseModel):
     feature_designation: Optional[LocationFeatureDesignation]
 
 
-class DefaultFinanceType(XmlBaseModel):
+class DefaultFinanceType(FlyweightModel):
     code: str
 
 
-class DefaultAidType(XmlBaseModel):
+class DefaultAidType(FlyweightModel):
     code: str
     vocabulary: Optional[str]
 
 
-class DefaultTiedStatus(XmlBaseModel):
+class DefaultTiedStatus(FlyweightModel):
     code: str
 
 
-class DefaultFlowType(XmlBaseModel):
+class DefaultFlowType(FlyweightModel):
     code: str
 
 
@@ -397,7 +404,7 @@ class Value(XmlBaseModel):
     amount: DecimalText
 
 
-class TransactionType(XmlBaseModel):
+class TransactionType(FlyweightModel):
     code: str
 
 
@@ -411,21 +418,21 @@ class Budget(XmlBaseModel):
     value: Value
 
 
-class ProviderOrg(XmlBaseModel):
+class ProviderOrg(FlyweightModel):
     provider_activity_id: Optional[ActivityId]
     type_: Optional[str]
     ref: Optional[OrganisationId]
     narrative: List[Narrative]
 
 
-class ReceiverOrg(XmlBaseModel):
+class ReceiverOrg(FlyweightModel):
     receiver_activity_id: Optional[ActivityId]
     type_: Optional[str]
     ref: Optional[OrganisationId]
     narrative: List[Narrative]
 
 
-class DisbursementChannel(XmlBaseModel):
+class DisbursementChannel(FlyweightModel):
     code: str
 
 
@@ -437,34 +444,34 @@ class Sector(XmlBaseModel):
     narrative: Optional[List[Narrative]]
 
 
-class TransactionRecipientCountry(XmlBaseModel):
+class TransactionRecipientCountry(FlyweightModel):
     code: str
 
 
-class TransactionRecipientRegion(XmlBaseModel):
+class TransactionRecipientRegion(FlyweightModel):
     code: str
     vocabulary: str
 
 
-class FlowType(XmlBaseModel):
+class FlowType(FlyweightModel):
     code: str
 
 
-class AidType(XmlBaseModel):
+class AidType(FlyweightModel):
     code: str
     vocabulary: str
 
 
-class TransactionSector(XmlBaseModel):
+class TransactionSector(FlyweightModel):
     code: str
     vocabulary: str
 
 
-class TiedStatus(XmlBaseModel):
+class TiedStatus(FlyweightModel):
     code: str
 
 
-class FinanceType(XmlBaseModel):
+class FinanceType(FlyweightModel):
     code: str
 
 
@@ -490,15 +497,15 @@ class Transaction(XmlBaseModel):
     tied_status: Optional[TiedStatus]
 
 
-class CollaborationType(XmlBaseModel):
+class CollaborationType(FlyweightModel):
     code: CollaborationTypeCode
 
 
-class DocumentCategory(XmlBaseModel):
+class DocumentCategory(FlyweightModel):
     code: DocumentCategoryCode
 
 
-class DocumentLanguage(XmlBaseModel):
+class DocumentLanguage(FlyweightModel):
     code: LanguageCode
 
 
@@ -711,7 +718,7 @@ class PlannedDisbursement(XmlBaseModel):
     type_: str
 
 
-class IatiActivity(XmlBaseModel):
+class IatiActivity(RecordModel):
 
     iati_identifier: TextField
     reporting_org: ReportingOrg
@@ -763,10 +770,54 @@ class IatiActivity(XmlBaseModel):
     crs_add: Optional[CrsAdd]
     fss: Optional[ForwardSpendingSurvey]
 
+    class Config:
+        identifier_field = "iati_identifier"
+
+
+class IatiActivitiesHeader(XmlBaseModel):
+    """
+    The attributes of the root `iati-activities` element
+    """
 
-class IatiActivities(XmlBaseModel):
     generated_datetime: datetime
     version: IatiVersionEnum
     linked_data_default: Optional[HttpUrl]
 
+
+class IatiActivities(IatiActivitiesHeader):
     iati_activity: List[IatiActivity]
+
+    @classmethod
+    def iter_file(cls, source: Union[str, PathLike, IO[bytes]], verbose: bool = True, **options) -> ElementStream:
+        """
+        Stream the activities in a (possibly very large) file one at a time,
+        without loading the whole document.
+        The root attributes are available as the stream's `header`
+
+        >>> stream = IatiActivities.iter_file(path)
+        >>> stream.header.version
+        >>> for activity in stream: ...
+        """
+        return ElementStream(source, item_class=IatiActivity, tag="iati-activity", header_class=IatiActivitiesHeader, verbose=verbose, **options)
+
+    @classmethod
+    def stream_url(cls, url: str, client: Optional[httpx.AsyncClient] = None, verbose: bool = True, **options) -> AsyncElementStream:
+        """
+        Download a file and parse its activities as they arrive
+
+        >>> async for activity in IatiActivities.stream_url(url, client=client): ...
+        """
+        return AsyncElementStream(url, item_class=IatiActivity, tag="iati-activity", header_class=IatiActivitiesHeader, client=client, verbose=verbose, **options)
+
+    @classmethod
+    def write_file(cls, target: Union[str, PathLike, IO[bytes]], activities: Iterable[IatiActivity], header: IatiActivitiesHeader, encoding: str = "us-ascii"):
+        """
+        Write activities out as they are produced, for instance from `iter_file`,
+        without building the whole document in memory
+
+        >>> stream = IatiActivities.iter_file(path)
+        >>> IatiActivities.write_file(out, stream, stream.header)
+        """
+        with ElementWriter(target, header, tag="iati-activities", encoding=encoding) as writer:
+            for activity in activities:
+                writer.write(activity, tag="iati-activity")
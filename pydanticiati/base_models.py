@@ -1,27 +1,43 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import os
 import re
+import sys
 import warnings
 import xml.etree.ElementTree as ET
+from concurrent.futures import Executor
 from datetime import date, datetime
 from decimal import Decimal
-from enum import Enum
-from typing import Any, List, Optional, Set, Type, Union
+from enum import Enum, IntEnum
+from typing import IO, Any, AsyncIterator, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Protocol, Tuple, Type, Union
 
 import httpx
+import xml_backend
 from pydantic import BaseModel as PydanticBaseModel
-from pydantic import HttpUrl, fields
+from pydantic import HttpUrl, PydanticValueError, ValidationError, fields
+from pydantic.datetime_parse import parse_date, parse_datetime
+from pydantic.error_wrappers import ErrorWrapper
+from pydantic.main import ModelMetaclass
+from pydantic.validators import bool_validator, decimal_validator, int_validator
 
 logger = logging.getLogger(__name__)
 
 
 class CodelistValue(str):
     """
-    Type used to indicate a codelist value
+    Type used to indicate a codelist value.
+    Subclasses name the codelist their values come from,
+    to check them against when parsing with `codelists`
     """
 
-    pass
+    codelist: Optional[str] = None
+
+
+class CodelistError(PydanticValueError):
+    code = "codelist"
+    msg_template = "{value!r} is not a code in the {codelist} codelist"
 
 
 NS = {"xml": "http://www.w3.org/XML/1998/namespace"}
@@ -64,10 +80,360 @@ class XmlLanguageField(str):
     pass
 
 
+# Attributes with few distinct values, repeated across many elements
+INTERNED_ATTRIBUTES = frozenset({"{http://www.w3.org/XML/1998/namespace}lang", "vocabulary", "currency", "ref", "code", "type"})
+
+
+class FieldPlan:
+    """
+    The parsing instructions for a single field of a model:
+    the getter to use, the attribute / tag name it reads from,
+    and how to coerce its value when parsing `trusted` data
+    """
+
+    __slots__ = ("field", "name", "type_", "shape", "attrib", "tag", "getter", "codelist", "coerce", "interned")
+
+    def __init__(self, field: fields.ModelField, getter: Callable[[XmlToModel, FieldPlan], Any]):
+        self.field = field
+        self.name = field.name
+        self.type_ = field.type_
+        self.shape = field.shape
+        self.attrib = XmlToModel.attrib_name(field)
+        self.tag = XmlToModel.tag_name(field)
+        self.getter = getter
+        self.codelist = field.type_.codelist if issubclass(field.type_, CodelistValue) else None
+        self.coerce = XmlToModel.resolve_coercer(field)
+        # Enum fields are converted to shared members anyway, so only plain strings are worth interning
+        self.interned = self.attrib in INTERNED_ATTRIBUTES and issubclass(field.type_, str) and not issubclass(field.type_, Enum)
+
+
+class ParsePlan:
+    """
+    A compiled "parse plan" for an XmlBaseModel subclass.
+    This resolves the getter, names and shape of every field once
+    so that parsing an element only runs the handlers which apply.
+    """
+
+    __slots__ = ("model_class", "fields", "expected", "codelist_fields", "coerced_fields", "flyweight", "record")
+
+    def __init__(self, model_class: Type[PydanticBaseModel]):
+        self.model_class = model_class
+        self.fields = [FieldPlan(field, XmlToModel.resolve_getter(field)) for field in model_class.__fields__.values()]
+        # Names which are "used" by this model, as attributes or as tags
+        self.expected = frozenset(f.attrib for f in self.fields)
+        self.codelist_fields = [f for f in self.fields if f.codelist]
+        self.coerced_fields = [f for f in self.fields if f.coerce]
+        # Whether identical instances can be shared in `compact` mode: not if they hold lists,
+        # which could be changed in place through any of the models sharing them
+        self.flyweight = issubclass(model_class, FlyweightModel) and all(f.shape == fields.SHAPE_SINGLETON for f in self.fields)
+        # Whether invalid instances are skipped when parsing with `errors`
+        self.record = issubclass(model_class, RecordModel)
+
+
+class Projection:
+    """
+    A compiled selection of fields to parse, from dotted paths:
+
+    >>> Projection(IatiActivity, ["iati_identifier", "transaction.value", "transaction.transaction_date"])
+
+    Only the selected fields of each model are read from the XML;
+    the others are set to None and left out of the model's `__fields_set__`.
+    A path to a nested model without any further names selects the whole model.
+    """
+
+    __slots__ = ("model_class", "fields", "nested", "unselected")
+
+    def __init__(self, model_class: Type[PydanticBaseModel], paths: Iterable[str], prefix: str = ""):
+        self.model_class = model_class
+        plan = XmlToModel.plan_for(model_class)
+        by_name = {field.name: field for field in plan.fields}
+
+        # Field name -> the paths selected within it, or None for the whole field
+        selected: Dict[str, Optional[List[str]]] = {}
+        for path in paths:
+            name, _, rest = path.partition(".")
+            if name not in by_name:
+                raise ValueError(f"{model_class.__name__} has no field {name!r} (in {prefix + path!r})")
+            if not rest:
+                selected[name] = None
+                continue
+            nested_paths = selected.setdefault(name, [])
+            if nested_paths is not None:
+                nested_paths.append(rest)
+
+        self.nested: Dict[str, Projection] = {}
+        for name, nested_paths in selected.items():
+            if nested_paths is None:
+                continue
+            if not issubclass(by_name[name].type_, XmlBaseModel):
+                raise ValueError(f"{model_class.__name__}.{name} has no fields to select (in {f'{prefix}{name}.{nested_paths[0]}'!r})")
+            self.nested[name] = Projection(by_name[name].type_, nested_paths, prefix=f"{prefix}{name}.")
+
+        self.fields = [field for field in plan.fields if field.name in selected]
+        self.unselected = {field.name: None for field in plan.fields if field.name not in selected}
+
+
+class Interner:
+    """
+    A table of strings, returning one shared copy of each distinct value
+    rather than a new string per element. Share one interner across the files of an ingest:
+
+    >>> interner = Interner()
+    >>> activities = [IatiActivities.from_file(path, interner=interner) for path in paths]
+    >>> interner.stats()
+
+    At most `max_size` distinct values are kept; values beyond that are returned as they are
+    """
+
+    __slots__ = ("table", "max_size", "hits", "misses", "saved_bytes")
+
+    def __init__(self, max_size: int = 100_000):
+        self.table: Dict[str, str] = {}
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.saved_bytes = 0
+
+    def __call__(self, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
+        try:
+            shared = self.table[value]
+        except KeyError:
+            self.misses += 1
+            if len(self.table) < self.max_size:
+                self.table[value] = value
+            return value
+        if shared is not value:
+            self.saved_bytes += sys.getsizeof(value)
+        self.hits += 1
+        return shared
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        How many values were looked up and shared, and the memory that saved
+        """
+        return {
+            "size": len(self.table),
+            "hits": self.hits,
+            "misses": self.misses,
+            "saved_bytes": self.saved_bytes,
+            "table_bytes": sum(sys.getsizeof(value) for value in self.table) + sys.getsizeof(self.table),
+        }
+
+
+class UnmappedContent:
+    """
+    Counts of the attributes and elements in parsed XML which no model field reads,
+    by (model, kind, name). Their content is dropped on serialization.
+
+    >>> unmapped = UnmappedContent()
+    >>> IatiActivities.from_file(path, unmapped=unmapped)
+    >>> unmapped.items()
+    [('IatiActivity', 'element', '{http://example.org/ext}extra', 18), ...]
+    """
+
+    ATTRIBUTE = "attribute"
+    ELEMENT = "element"
+
+    __slots__ = ("counts",)
+
+    def __init__(self):
+        self.counts: Dict[Tuple[Type, str, str], int] = {}
+
+    def add(self, model_class: Type, kind: str, name: str, count: int = 1):
+        key = (model_class, kind, name)
+        self.counts[key] = self.counts.get(key, 0) + count
+
+    def items(self) -> List[Tuple[str, str, str, int]]:
+        """
+        (model name, kind, name, count), most frequent first
+        """
+        counts = sorted(self.counts.items(), key=lambda item: (-item[1], item[0][0].__name__, item[0][1], item[0][2]))
+        return [(model_class.__name__, kind, name, count) for (model_class, kind, name), count in counts]
+
+    def summary(self, limit: int = 10) -> str:
+        items = self.items()
+        lines = [f"{count} x {kind} {name} in {model}" for model, kind, name, count in items[:limit]]
+        if len(items) > limit:
+            lines.append(f"... and {len(items) - limit} more")
+        return "; ".join(lines)
+
+    def warn(self):
+        """
+        A single warning for everything unmapped, if there was anything
+        """
+        if self.counts:
+            warnings.warn(f"Unmapped content, dropped on serialization: {self.summary()}")
+
+
+class ParseError(PydanticBaseModel):
+    """
+    An invalid record skipped by a tolerant parse
+    """
+
+    model: str
+    identifier: Optional[str]
+    xpath: str
+    sourceline: Optional[int]
+    # The model which failed validation (the record, or a model nested in it) and its pydantic errors
+    invalid_model: str
+    errors: List[Dict[str, Any]]
+
+
+class ParseErrors:
+    """
+    The records skipped by tolerant parsing, which carries on past them:
+
+    >>> errors = ParseErrors()
+    >>> activities = IatiActivities.from_file(path, errors=errors)
+    >>> errors.summary()
+    """
+
+    __slots__ = ("errors",)
+
+    def __init__(self):
+        self.errors: List[ParseError] = []
+
+    def add(self, error: ParseError):
+        self.errors.append(error)
+
+    def __iter__(self) -> Iterator[ParseError]:
+        return iter(self.errors)
+
+    def counts(self) -> Dict[Tuple[str, str, str], int]:
+        """
+        The number of each (model, location, error type), most frequent first
+        """
+        counts: Dict[Tuple[str, str, str], int] = {}
+        for error in self.errors:
+            for detail in error.errors:
+                key = (error.invalid_model, ".".join(str(loc) for loc in detail["loc"]), detail["type"])
+                counts[key] = counts.get(key, 0) + 1
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+    def summary(self, limit: int = 10) -> str:
+        counts = list(self.counts().items())
+        lines = [f"{len(self.errors)} invalid records skipped"]
+        lines.extend(f"{count} x {kind} at {model}.{loc}" for (model, loc, kind), count in counts[:limit])
+        if len(counts) > limit:
+            lines.append(f"... and {len(counts) - limit} more")
+        return "; ".join(lines)
+
+
+class ParseContext:
+    """
+    Options shared by every element parsed in one `from_element` call
+
+    `codelists` is an index of codes (such as `codelists.store.CodelistIndex`):
+    when given, `CodelistValue` fields are checked against it. Fields of codelists
+    which are not in the index (`codes` returns None) are not checked
+
+    `trusted` skips pydantic validation for data known to be valid
+    (for instance, XML we wrote ourselves): values are coerced to their field types
+    and models are built with `construct`. Invalid data is not reported in this mode
+
+    `lazy` leaves nested models unparsed until they are first accessed (see `Deferred`),
+    keeping their source elements until then
+
+    `compact` shares one instance between identical `FlyweightModel`s,
+    up to `max_instances` distinct ones. Shared instances are immutable (see `frozen_model`)
+
+    `interner` shares the strings read from low-cardinality attributes (see `INTERNED_ATTRIBUTES`).
+    `compact` mode uses a new `Interner` unless one is given
+
+    `unmapped` collects the attributes and elements which were not parsed into any field
+
+    `errors` makes parsing tolerant: invalid `RecordModel`s are skipped and recorded there
+    rather than failing the whole parse
+    """
+
+    __slots__ = ("codelists", "trusted", "lazy", "compact", "instances", "max_instances", "interner", "unmapped", "errors")
+
+    def __init__(
+        self,
+        codelists: Optional[CodelistLookup] = None,
+        trusted: bool = False,
+        lazy: bool = False,
+        compact: bool = False,
+        max_instances: int = 100_000,
+        interner: Optional[Interner] = None,
+        unmapped: Optional[UnmappedContent] = None,
+        errors: Optional[ParseErrors] = None,
+    ):
+        self.codelists = codelists
+        self.trusted = trusted
+        self.lazy = lazy
+        self.compact = compact
+        self.instances: Dict[Tuple, PydanticBaseModel] = {}
+        self.max_instances = max_instances
+        self.interner = Interner() if interner is None and compact else interner
+        self.unmapped = unmapped
+        self.errors = errors
+
+
+class CodelistLookup(Protocol):
+    def codes(self, codelist: str) -> Optional[FrozenSet[str]]:
+        ...
+
+
+class ModelCache(Protocol):
+    """
+    A cache of parsed files, such as `cache.ParseCache`
+    """
+
+    def load(self, model_class: Type[XmlBaseModel], path: Union[str, os.PathLike], **options) -> XmlBaseModel:
+        ...
+
+
+_parse_plans: Dict[Type[PydanticBaseModel], ParsePlan] = {}
+
+
 class XmlToModel:
-    def __init__(self, model_class: Type[PydanticBaseModel], element: ET.Element):
+
+    # (type, getter) pairs, populated once the model types are defined below
+    getters: Tuple[Tuple[Type, Callable[[XmlToModel, FieldPlan], Any]], ...] = ()
+
+    def __init__(
+        self, model_class: Type[PydanticBaseModel], element: ET.Element, context: Optional[ParseContext] = None, projection: Optional[Projection] = None
+    ):
         self.model_class = model_class
         self.element = element
+        self.context = context or ParseContext()
+        self.plan = self.plan_for(model_class)
+        # The fields to parse; all of them when None
+        self.projection = projection
+        self._children: Optional[Dict[str, List[ET.Element]]] = None
+
+    @staticmethod
+    def plan_for(model_class: Type[PydanticBaseModel]) -> ParsePlan:
+        """
+        Return the (cached) parse plan for a model class
+        """
+        try:
+            return _parse_plans[model_class]
+        except KeyError:
+            plan = _parse_plans[model_class] = ParsePlan(model_class)
+            return plan
+
+    @property
+    def children(self) -> Dict[str, List[ET.Element]]:
+        """
+        The child elements grouped by tag, gathered in a single pass.
+        Looking fields up here is much cheaper than repeated `find` calls,
+        particularly with lxml elements.
+        """
+        if self._children is None:
+            children: Dict[str, List[ET.Element]] = {}
+            self._children = children
+            for child in self.element:
+                # lxml gives comments and processing instructions a non-string tag
+                if isinstance(child.tag, str):
+                    children.setdefault(child.tag, []).append(child)
+        return self._children
 
     @staticmethod
     def attrib_name(field: fields.ModelField) -> str:
@@ -88,130 +454,433 @@ class XmlToModel:
         """
         return field.name.replace("_", "-")
 
-    def check_unused_attribs(self) -> Optional[Set[str]]:
+    @classmethod
+    def resolve_getter(cls, field: fields.ModelField) -> Callable[[XmlToModel, FieldPlan], Any]:
         """
-        Check whether there are any attributes not listed in the "fields"
-        This is information which is dropped on serialization
+        Return the method used to read a field's value from an element.
+        The first type in `getters` which the field type subclasses wins.
         """
-        attribs = set(self.element.attrib.keys())
-        fields = set([self.attrib_name(f) for f in self.model_class.__fields__.values()])
-        unused_attribs = attribs.difference(fields)
-        if unused_attribs:
-            warnings.warn(f"Unprocessed attribs: {unused_attribs}  in {self.model_class}")
-            return unused_attribs
-        return None
+        for type_, method in cls.getters:
+            if issubclass(field.type_, type_):
+                return method
+        warnings.warn(f"Encountered unlisted type: {field.type_}, using default Attrib method")
+        return cls.get_attrib
 
-    def check_unused_elements(self) -> Optional[Set[str]]:
+    @staticmethod
+    def resolve_coercer(field: fields.ModelField) -> Optional[Callable[[Any], Any]]:
+        """
+        Return the function which converts a value read from XML to a field's type
+        in `trusted` mode: the cheap equivalent of the field's pydantic validators.
+        None if the value is used as it is
         """
-        Check whether there are any elements not listed in the "fields"
+        type_ = field.type_
+        if field.shape != fields.SHAPE_SINGLETON or issubclass(type_, XmlBaseModel):
+            # Nested models were built a level down
+            return None
+        if issubclass(type_, IntEnum):
+            return lambda value: type_(int(value))
+        if issubclass(type_, Enum):
+            return type_
+        if issubclass(type_, str) and not issubclass(type_, HttpUrl):
+            return None
+        if issubclass(type_, bool):
+            return bool_validator
+        if issubclass(type_, int):
+            return int_validator
+        if issubclass(type_, datetime):
+            return parse_datetime
+        if issubclass(type_, date):
+            return parse_date
+        if issubclass(type_, Decimal):
+            return decimal_validator
+
+        def validate(value):
+            value, errors = field.validate(value, {}, loc=field.name)
+            if errors:
+                raise ValidationError([errors], PydanticBaseModel)
+            return value
+
+        return validate
+
+    def check_unmapped(self, report: UnmappedContent):
+        """
+        Count the attributes and child elements which no field reads.
         This is information which is dropped on serialization
         """
-        tags = set([e.tag for e in self.element])
-        fields = set([self.attrib_name(f) for f in self.model_class.__fields__.values()])
-        unused_elements = tags.difference(fields)
-        if unused_elements:
-            warnings.warn(f"Unprocessed elements: {unused_elements} in {self.model_class}")
-            return unused_elements
-        return None
+        expected = self.plan.expected
+        for name in self.element.attrib:
+            if name not in expected:
+                report.add(self.model_class, UnmappedContent.ATTRIBUTE, name)
+        # The children were grouped while reading the fields, so this is a check per distinct tag
+        for tag, elements in self.children.items():
+            if tag not in expected:
+                report.add(self.model_class, UnmappedContent.ELEMENT, tag, len(elements))
+
+    def check_codelists(self, data: Dict[str, Any], codelists: CodelistLookup):
+        """
+        Check the values of codelist fields against the codelist index:
+        a set lookup per field
+        """
+        errors = []
+        for field in self.plan.codelist_fields:
+            assert field.codelist is not None
+            value = data.get(field.name)
+            codes = codelists.codes(field.codelist)
+            if value is None or codes is None:
+                continue
+            if value not in codes:
+                errors.append(ErrorWrapper(CodelistError(value=value, codelist=field.codelist), loc=field.name))
+        if errors:
+            raise ValidationError(errors, self.model_class)
+
+    def get_attrib(self, field: FieldPlan):
+        if field.interned and self.context.interner is not None:
+            return self.context.interner(self.element.get(field.attrib))
+        return self.element.get(field.attrib)
+
+    def get_text(self, field: FieldPlan) -> Optional[Union[str, int]]:
+        found = self.children.get(field.tag)
+        if not found:
+            return None
+        text_element = found[0]
+        if field.type_ != str:
+            return self.convert(field, text_element.text)
+        return text_element.text
 
-    def from_element(self, verbose: bool = True):
-        def get_attrib(field: fields.ModelField):
-            return self.element.get(self.attrib_name(field))
+    def get_element_text(self, field: FieldPlan):
+        if field.type_ != str:
+            return self.convert(field, self.element.text)
+        return self.element.text
 
-        def get_text(field: fields.ModelField) -> Optional[Union[str, int]]:
-            text_element = self.element.find(self.tag_name(field))
-            if text_element is None:
+    def convert(self, field: FieldPlan, value: Any) -> Any:
+        """
+        Convert a value read from XML to its field's type, with the field's coercer when it has one.
+        A value which can't be converted raises a ValidationError for the field,
+        like the ones raised by pydantic, so that tolerant parsing can skip its record
+        """
+        if value is None:
+            return None
+        try:
+            return field.coerce(value) if field.coerce else field.type_(value)
+        except (ValueError, TypeError, ArithmeticError) as error:
+            raise ValidationError([ErrorWrapper(error, loc=field.name)], self.model_class) from error
+
+    def nested_projection(self, field: FieldPlan) -> Optional[Projection]:
+        return self.projection.nested.get(field.name) if self.projection else None
+
+    def get_nested_xml(self, field: FieldPlan):
+        projection = self.nested_projection(field)
+
+        if self.context.lazy:
+            found = self.children.get(field.tag)
+            if not found:
+                return None if field.shape == fields.SHAPE_SINGLETON else []
+            return Deferred(field, found, self.context, projection)
+
+        if field.shape == fields.SHAPE_SINGLETON:
+            found = self.children.get(field.tag)
+            if not found:
                 return None
-            if field.type_ != str:
-                return field.type_(text_element.text)
-            return text_element.text
-
-        def get_element_text(field: fields.ModelField):
-            if field.type_ != str:
-                return field.type_(self.element.text)
-            return self.element.text
-
-        def get_nested_xml(field: fields.ModelField):
-
-            if field.shape == fields.SHAPE_SINGLETON:
-                element = self.element.find(self.tag_name(field), namespaces=NS)
-                if element is None:
-                    return None
-                return XmlToModel(model_class=field.type_, element=element).from_element()
-
-            if field.shape == fields.SHAPE_LIST:
-                return [XmlToModel(model_class=field.type_, element=child_element).from_element() for child_element in self.element.findall(self.tag_name(field), namespaces=NS)]
-
-        def get_narratives(field: fields.ModelField):
-            """
-            Narratives are a special case of nested XML
-            Since these are very often a simple list with no other info
-            these can be specified like
-            >>> description: List[Narrative]
-            """
-
-            if field.name == "narrative":
-                path = "narrative"
-            else:
-                raise DeprecationWarning("Please use a nested Narrative")
-            return [XmlToModel(model_class=field.type_, element=child_element).from_element() for child_element in self.element.findall(path, namespaces=NS)]
+            return XmlToModel(model_class=field.type_, element=found[0], context=self.context, projection=projection).from_element()
 
-        def get_language_field(field: fields.ModelField):
-            return self.element.get("xml:lang") or self.element.get(f"{{{NS['xml']}}}lang")
+        if field.shape == fields.SHAPE_LIST:
+            if self.context.errors is not None and self.plan_for(field.type_).record:
+                return self.get_records(field, projection)
+            return [
+                XmlToModel(model_class=field.type_, element=child_element, context=self.context, projection=projection).from_element()
+                for child_element in self.children.get(field.tag, ())
+            ]
 
-        def get_uri(field: fields.ModelField) -> Optional[str]:
-            uri = self.element.get(self.attrib_name(field))
-            if uri != "":
-                return uri
+    def get_records(self, field: FieldPlan, projection: Optional[Projection]):
+        """
+        Parse a list of records, skipping the invalid ones and recording their errors
+        """
+        records = []
+        for position, child_element in enumerate(self.children.get(field.tag, ()), 1):
+            record = XmlToModel(model_class=field.type_, element=child_element, context=self.context, projection=projection)
+            parsed = record.from_record(f"{self.xpath()}/{field.tag}[{position}]")
+            if parsed is not None:
+                records.append(parsed)
+        return records
+
+    def from_record(self, xpath: str):
+        """
+        Parse a record; if it is invalid, add its errors to the context's `errors` and return None
+        """
+        errors = self.context.errors
+        assert errors is not None, "Records are only parsed with a context which has `errors`"
+        try:
+            return self.from_element()
+        except ValidationError as error:
+            errors.add(self.error(error, xpath))
             return None
 
-        getters = {
-            HttpUrl: get_uri,
-            Narrative: get_narratives,
-            TextField: get_text,
-            IntField: get_text,
-            XmlLanguageField: get_language_field,
-            ThisElementTextField: get_element_text,
-            DecimalText: get_element_text,
-            XmlBaseModel: get_nested_xml,
-            str: get_attrib,
-            bool: get_attrib,
-            int: get_attrib,
-            datetime: get_attrib,
-            date: get_attrib,
-            Decimal: get_attrib,
-            Enum: get_attrib,
-        }
+    def xpath(self) -> str:
+        """
+        The XPath of this element. ElementTree elements don't know their parents,
+        so for those this is only right for the root element
+        """
+        return xml_backend.getpath(self.element) or f"/{self.element.tag}"
+
+    def error(self, error: ValidationError, xpath: str) -> ParseError:
+        """
+        A compact description of why this record's element is invalid
+        """
+        identifier = None
+        identifier_field = getattr(self.model_class.__config__, "identifier_field", None)
+        if identifier_field:
+            field = next(field for field in self.plan.fields if field.name == identifier_field)
+            identifier = field.getter(self, field)
+        return ParseError(
+            model=self.model_class.__name__,
+            identifier=identifier,
+            xpath=xpath,
+            sourceline=getattr(self.element, "sourceline", None),
+            invalid_model=error.model.__name__,
+            errors=error.errors(),
+        )
+
+    def get_narratives(self, field: FieldPlan):
+        """
+        Narratives are a special case of nested XML
+        Since these are very often a simple list with no other info
+        these can be specified like
+        >>> description: List[Narrative]
+        """
+
+        if field.name == "narrative":
+            path = "narrative"
+        else:
+            raise DeprecationWarning("Please use a nested Narrative")
+        projection = self.nested_projection(field)
+        return [XmlToModel(model_class=field.type_, element=child_element, context=self.context, projection=projection).from_element() for child_element in self.children.get(path, ())]
+
+    def get_language_field(self, field: FieldPlan):
+        lang = self.element.get("xml:lang") or self.element.get(f"{{{NS['xml']}}}lang")
+        if self.context.interner is not None:
+            return self.context.interner(lang)
+        return lang
+
+    def get_uri(self, field: FieldPlan) -> Optional[str]:
+        uri = self.element.get(field.attrib)
+        if uri != "":
+            return uri
+        return None
+
+    def from_element(self):
         """
         This is a "best effort" approach to parse an XML element into a sane Pydantic class.
         Common fields like "text" and "lang" and narratives are handled here
         as well as basic attributes and nested fields.
         """
-        # Iterate over the fields for "nested", "narrative", "text" and "attribute" type fields
-        data = dict()  # type: dict[str, Any]
+        # Each field's getter has been resolved in advance by the model's parse plan
+        data: Dict[str, Any] = {field.name: field.getter(self, field) for field in (self.projection.fields if self.projection else self.plan.fields)}
 
-        # Generally the attribute name or xml tag name
-        # is the field name replacing '_' -> '-'
+        if self.context.unmapped is not None:
+            self.check_unmapped(self.context.unmapped)
 
-        for field in self.model_class.__fields__.values():  # type: fields.ModelField
-            for type_, method in getters.items():
-                if field.name not in data and issubclass(field.type_, type_):
-                    data[field.name] = method(field)
-            if field.name not in data:
-                warnings.warn(f"Encountered unlisted type: {field.type_}, using default Attrib method")
-                data[field.name] = get_attrib(field)
+        if self.context.codelists is not None and self.plan.codelist_fields:
+            self.check_codelists(data, self.context.codelists)
 
-        if verbose:
-            self.check_unused_attribs()
-            self.check_unused_elements()
+        if self.context.compact and self.plan.flyweight:
+            return self.shared(data)
+        return self.build(data)
 
+    def shared(self, data: Dict[str, Any]):
+        """
+        The instance already built from the same values, if there is one
+        """
+        key = (self.model_class, *((name, _freeze(value)) for name, value in data.items()))
         try:
-            return self.model_class(**data)
-        except Exception as E:
-            logger.error(ET.tostring(self.element))
-            logger.error(data)
-            logger.error(f"{E}")
-            raise
+            return self.context.instances[key]
+        except KeyError:
+            model = self.build(data, frozen=True)
+            if len(self.context.instances) < self.context.max_instances:
+                self.context.instances[key] = model
+            return model
+
+    def build(self, data: Dict[str, Any], frozen: bool = False):
+        """
+        Build the model; as its immutable subclass if it is `frozen` to be shared
+        """
+        if self.context.trusted:
+            for field in self.plan.coerced_fields:
+                value = data.get(field.name)
+                if value is not None:
+                    data[field.name] = self.convert(field, value)
+            return self.construct(data, frozen)
+
+        if self.context.lazy or self.projection:
+            self.validate_fields(data)
+            return self.construct(data, frozen)
+
+        return (frozen_model(self.model_class) if frozen else self.model_class)(**data)
+
+    def validate_fields(self, data: Dict[str, Any]):
+        """
+        Validate each field which has been read, in place, leaving the `Deferred` ones
+        to be validated when they are parsed
+        """
+        errors = []
+        for name, value in data.items():
+            if not isinstance(value, Deferred):
+                data[name], error = self.model_class.__fields__[name].validate(value, data, loc=name, cls=self.model_class)
+                if error:
+                    errors.append(error)
+        if errors:
+            raise ValidationError(errors, self.model_class)
+
+    def construct(self, data: Dict[str, Any], frozen: bool = False):
+        """
+        Build the model from values which are already valid
+        """
+        if frozen:
+            # Shared models have no nested models to defer
+            model_class = frozen_model(self.model_class)
+        else:
+            model_class = lazy_model(self.model_class) if self.context.lazy else self.model_class
+        if self.projection:
+            return model_class.construct(_fields_set=set(data), **self.projection.unselected, **data)
+        return model_class.construct(**data)
+
+
+def _freeze(value: Any) -> Any:
+    """
+    A hashable form of a field value: lists become tuples and models their class and values
+    """
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, PydanticBaseModel):
+        return (value.__class__, *(_freeze(item) for item in value.__dict__.values()))
+    return value
+
+
+class Deferred:
+    """
+    A nested model field which has not been parsed yet:
+    the elements to parse it from, and how
+    """
+
+    __slots__ = ("field", "elements", "context", "projection")
+
+    def __init__(self, field: FieldPlan, elements: List[ET.Element], context: ParseContext, projection: Optional[Projection] = None):
+        self.field = field
+        self.elements = elements
+        self.context = context
+        self.projection = projection
+
+    def parse(self):
+        if self.field.shape == fields.SHAPE_SINGLETON:
+            return XmlToModel(model_class=self.field.type_, element=self.elements[0], context=self.context, projection=self.projection).from_element()
+        return [XmlToModel(model_class=self.field.type_, element=element, context=self.context, projection=self.projection).from_element() for element in self.elements]
+
+    def __repr__(self) -> str:
+        return f"<Deferred {self.field.type_.__name__} from {len(self.elements)} element(s)>"
+
+
+class DeferredField:
+    """
+    Parses a `Deferred` field value on first access, and caches the result
+    in place of it
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.name]
+        if isinstance(value, Deferred):
+            value = instance.__dict__[self.name] = value.parse()
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = value
+
+
+_lazy_models: Dict[Type[PydanticBaseModel], Type[PydanticBaseModel]] = {}
+
+
+def lazy_model(model_class: Type[PydanticBaseModel]) -> Type[PydanticBaseModel]:
+    """
+    Return the (cached) lazy subclass of a model: it has the same name and fields,
+    but its nested model fields are parsed on first access.
+    Anything which reads the whole model (`dict`, `json`, `copy`, comparisons, pickling)
+    parses everything first.
+    """
+    try:
+        return _lazy_models[model_class]
+    except KeyError:
+        pass
+
+    nested = [field.name for field in XmlToModel.plan_for(model_class).fields if field.getter is XmlToModel.get_nested_xml]
+
+    def materialize(self):
+        for name in nested:
+            getattr(self, name)
+
+    def _iter(self, *args, **kwargs):
+        materialize(self)
+        return model_class._iter(self, *args, **kwargs)
+
+    def __iter__(self):
+        materialize(self)
+        return model_class.__iter__(self)
+
+    def __reduce__(self):
+        # Pickle as the eager model, which can be imported by name
+        materialize(self)
+        return _unpickle_model, (model_class, self.__getstate__())
+
+    lazy: Type[PydanticBaseModel] = ModelMetaclass(
+        model_class.__name__,
+        (model_class,),
+        {"__module__": model_class.__module__, "__qualname__": model_class.__qualname__, "_iter": _iter, "__iter__": __iter__, "__reduce__": __reduce__},
+    )
+    for name in nested:
+        setattr(lazy, name, DeferredField(name))
+    _lazy_models[model_class] = lazy
+    return lazy
+
+
+def _unpickle_model(model_class: Type[PydanticBaseModel], state: Dict[str, Any]):
+    model = model_class.__new__(model_class)
+    model.__setstate__(state)
+    return model
+
+
+_frozen_models: Dict[Type[PydanticBaseModel], Type[PydanticBaseModel]] = {}
+
+
+def frozen_model(model_class: Type[PydanticBaseModel]) -> Type[PydanticBaseModel]:
+    """
+    Return the (cached) immutable subclass of a model, for the instances shared by `compact` parsing:
+    it has the same name and fields, but they can't be set
+    """
+    try:
+        return _frozen_models[model_class]
+    except KeyError:
+        pass
+
+    class Config:
+        allow_mutation = False
+
+    def __reduce__(self):
+        # Pickle by the model class, which can be imported by name
+        return _unpickle_frozen_model, (model_class, self.__getstate__())
+
+    frozen: Type[PydanticBaseModel] = ModelMetaclass(
+        model_class.__name__,
+        (model_class,),
+        {"__module__": model_class.__module__, "__qualname__": model_class.__qualname__, "Config": Config, "__reduce__": __reduce__},
+    )
+    _frozen_models[model_class] = frozen
+    return frozen
+
+
+def _unpickle_frozen_model(model_class: Type[PydanticBaseModel], state: Dict[str, Any]):
+    return _unpickle_model(frozen_model(model_class), state)
 
 
 class XmlBaseModel(PydanticBaseModel):
@@ -223,19 +892,61 @@ class XmlBaseModel(PydanticBaseModel):
     """
 
     @classmethod
-    def from_element(cls, element: ET.Element, verbose: bool = True):
-        return XmlToModel(model_class=cls, element=element).from_element()
+    def from_element(
+        cls,
+        element: ET.Element,
+        verbose: bool = True,
+        fields: Optional[Union[Iterable[str], Projection]] = None,
+        context: Optional[ParseContext] = None,
+        **options,
+    ):
+        """
+        Parse an element. `options` are passed to the `ParseContext`,
+        or an existing `context` can be shared between calls.
+        `fields` selects the paths to parse (see `Projection`); by default everything is parsed.
+        When `verbose`, content which is not parsed into any field is reported in one warning,
+        unless an `unmapped` report is given to collect it
+        """
+        if fields is not None and not isinstance(fields, Projection):
+            fields = Projection(cls, fields)
+        report = None
+        if context is None:
+            if verbose and options.get("unmapped") is None:
+                report = options["unmapped"] = UnmappedContent()
+            context = ParseContext(**options)
+        model = XmlToModel(model_class=cls, element=element, context=context, projection=fields).from_element()
+        if report is not None:
+            report.warn()
+        return model
+
+    @classmethod
+    def from_file(cls, path: Union[str, os.PathLike, IO[bytes]], cache: Optional[ModelCache] = None, **options):
+        """
+        Parse a file, or load it from `cache` if it has been parsed before
+        """
+        if cache is not None and isinstance(path, (str, os.PathLike)):
+            return cache.load(cls, path, **options)
+        return cls.from_element(xml_backend.parse(path), **options)
+
+    @classmethod
+    def from_bytes(cls, content: Union[str, bytes], **options):
+        return cls.from_element(xml_backend.fromstring(content), **options)
 
     @classmethod
     async def from_url(cls, url: str, client: Optional[httpx.AsyncClient] = None):
         if client:
             response = await client.get(url)
         else:
-            with httpx.AsyncClient(timeout=httpx.Timeout(10.0, connect=60.0)) as client:
+            async with httpx.AsyncClient(timeout=httpx.Timeout(10.0, connect=60.0)) as client:
                 response = await client.get(url)
-        return cls.from_element(ET.fromstring(response.content))
+        return cls.from_bytes(response.content)
 
-    def to_element(self, field: Optional[fields.ModelField] = None, tag_name: Optional[str] = None):
+    def to_element(self, field: Optional[fields.ModelField] = None, tag_name: Optional[str] = None, check: bool = True):
+        """
+        Build an Element from this model.
+        When `check` is set the finished tree is test-serialized, raising a ValueError if that fails;
+        nested elements are built without the check as it is done once for the whole tree.
+        """
 
         if not tag_name:
             if field:
@@ -243,7 +954,7 @@ class XmlBaseModel(PydanticBaseModel):
             else:
                 tag_name = re.sub(r"(?<!^)(?=[A-Z])", "-", self.__class__.__name__).lower()
 
-        el = ET.Element(f"{tag_name}" or "")
+        el = xml_backend.Element(f"{tag_name}" or "")
 
         def is_sub(field: fields.ModelField, klasses: Union[Type, List[Type]]) -> bool:
             if isinstance(klasses, List):
@@ -272,10 +983,10 @@ class XmlBaseModel(PydanticBaseModel):
                 el.set(attr_key, str(int(attr)))
 
             elif is_sub(field, [TextField]):
-                ET.SubElement(el, attr_key).text = str(attr)
+                xml_backend.SubElement(el, attr_key).text = str(attr)
 
             elif is_sub(field, XmlLanguageField):
-                el.set("xml:lang", attr)
+                el.set(f"{{{NS['xml']}}}lang", attr)
 
             elif is_sub(field, ThisElementTextField):
                 el.text = attr
@@ -298,27 +1009,334 @@ class XmlBaseModel(PydanticBaseModel):
                 # This is a 'nested' element
                 try:
                     if field.shape == fields.SHAPE_SINGLETON:
-                        el.append(attr.to_element(field))
+                        el.append(attr.to_element(field, check=False))
                     if field.shape == fields.SHAPE_LIST:
-                        el.extend([a.to_element(field) for a in attr])
+                        el.extend([a.to_element(field, check=False) for a in attr])
                 except TypeError:
                     raise
 
             else:
                 raise NotImplementedError
 
+        if check:
+            try:
+                xml_backend.tostring(el)
+            except Exception as E:
+                raise ValueError from E
+        return el
+
+
+class StreamParser:
+    """
+    Parses each `tag` child of a document's root element into an `item_class` model as it is read,
+    sharing one `ParseContext` between them. The root element's attributes are parsed into `header_class`
+    """
+
+    def __init__(
+        self,
+        item_class: Type[XmlBaseModel],
+        tag: str,
+        header_class: Optional[Type[XmlBaseModel]] = None,
+        verbose: bool = True,
+        fields: Optional[Iterable[str]] = None,
+        **options,
+    ):
+        self.item_class = item_class
+        self.tag = tag
+        self.header_class = header_class
+        # Compile the projection once, rather than for each item
+        self.fields = Projection(item_class, fields) if fields is not None else None
+        # Warn about unmapped content once the stream is finished, unless the caller collects it
+        self._warn = verbose and options.get("unmapped") is None
+        if self._warn:
+            options["unmapped"] = UnmappedContent()
+        # One context for every item, so that `compact` instances are shared between them
+        self.context = ParseContext(**options)
+        # Invalid records are skipped when there is somewhere to record their errors
+        self._tolerant = self.context.errors is not None and XmlToModel.plan_for(item_class).record
+        self._root: Optional[ET.Element] = None
+        self._header: Optional[XmlBaseModel] = None
+
+    def _parse_root(self, root: ET.Element):
+        self._root = root
+        if self.header_class:
+            # Only the attributes are wanted: children may already have been parsed into the root
+            self._header = self.header_class.from_element(xml_backend.Element(root.tag, dict(root.attrib)), context=self.context)
+
+    def _parse_item(self, element: ET.Element, position: int) -> Optional[XmlBaseModel]:
+        """
+        Parse the `position`th item; None if it is invalid and skipped
+        """
+        if not self._tolerant:
+            return self.item_class.from_element(element, fields=self.fields, context=self.context)
+        # Items are read after the root
+        assert self._root is not None
+        return XmlToModel(self.item_class, element, context=self.context, projection=self.fields).from_record(f"/{self._root.tag}/{self.tag}[{position}]")
+
+    def _finish(self):
+        if self._warn:
+            self.context.unmapped.warn()
+
+
+class ElementStream(StreamParser):
+    """
+    Incrementally parse an XML document, yielding one `item_class` model
+    for each `tag` child of the root element.
+    Each child is dropped from the tree once it has been parsed,
+    so memory use does not grow with the size of the document.
+
+    The root element's attributes are available as `header`,
+    parsed into `header_class`.
+    """
+
+    def __init__(
+        self,
+        source: Union[str, os.PathLike, IO[bytes]],
+        item_class: Type[XmlBaseModel],
+        tag: str,
+        header_class: Optional[Type[XmlBaseModel]] = None,
+        verbose: bool = True,
+        fields: Optional[Iterable[str]] = None,
+        **options,
+    ):
+        super().__init__(item_class, tag, header_class=header_class, verbose=verbose, fields=fields, **options)
+        self._file: Optional[IO[bytes]] = None
+        if isinstance(source, (str, os.PathLike)):
+            source = self._file = open(source, "rb")
+        self._elements = xml_backend.iterchildren(source, tag)
+
+    def _read_root(self) -> ET.Element:
+        root = self._root
+        if root is None:
+            root = next(self._elements)
+            self._parse_root(root)
+        return root
+
+    @property
+    def header(self) -> Optional[XmlBaseModel]:
+        self._read_root()
+        return self._header
+
+    def __iter__(self) -> Iterator[XmlBaseModel]:
+        self._read_root()
         try:
-            ET.tostring(el)
+            for position, element in enumerate(self._elements, 1):
+                item = self._parse_item(element, position)
+                if item is not None:
+                    yield item
+            self._finish()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> ElementStream:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class AsyncElementStream(StreamParser):
+    """
+    Download and parse a document at the same time, yielding one `item_class` model
+    for each `tag` child of the root element:
+
+    >>> async for activity in IatiActivities.stream_url(url, client=client):
+    ...     ...
+
+    Response chunks are fed to an incremental parser as they arrive. The completed elements
+    are parsed into models in `executor` (the event loop's default executor when None) while
+    the download carries on, so the event loop is free to serve other downloads.
+    One batch of elements is parsed at a time, in document order.
+    The executor must be a thread pool, as elements can't be sent to other processes.
+
+    The root element's attributes are available as `header` once the first item has been yielded.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        item_class: Type[XmlBaseModel],
+        tag: str,
+        header_class: Optional[Type[XmlBaseModel]] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        executor: Optional[Executor] = None,
+        verbose: bool = True,
+        fields: Optional[Iterable[str]] = None,
+        **options,
+    ):
+        super().__init__(item_class, tag, header_class=header_class, verbose=verbose, fields=fields, **options)
+        self.url = url
+        self.client = client
+        self.executor = executor
+        self._count = 0
+
+    @property
+    def header(self) -> Optional[XmlBaseModel]:
+        return self._header
+
+    def _parse_items(self, elements: List[ET.Element]) -> List[XmlBaseModel]:
+        items = []
+        for element in elements:
+            self._count += 1
+            item = self._parse_item(element, self._count)
+            if item is not None:
+                items.append(item)
+        return items
+
+    async def __aiter__(self) -> AsyncIterator[XmlBaseModel]:
+        if self.client is None:
+            async with httpx.AsyncClient(timeout=httpx.Timeout(10.0, connect=60.0)) as client:
+                async for item in self._stream(client):
+                    yield item
+        else:
+            async for item in self._stream(self.client):
+                yield item
+
+    async def _stream(self, client: httpx.AsyncClient) -> AsyncIterator[XmlBaseModel]:
+        loop = asyncio.get_running_loop()
+        parser = xml_backend.ChildParser(self.tag)
+        # Completed elements waiting to be parsed, and the batch being parsed
+        elements: List[ET.Element] = []
+        parsing: Optional[asyncio.Future] = None
+
+        async with client.stream("GET", self.url) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                elements.extend(self._feed(parser.feed(chunk)))
+                if parsing is not None and parsing.done():
+                    for item in parsing.result():
+                        yield item
+                    parsing = None
+                if parsing is None and elements:
+                    parsing, elements = loop.run_in_executor(self.executor, self._parse_items, elements), []
+            elements.extend(self._feed(parser.close()))
+
+        if parsing is not None:
+            for item in await parsing:
+                yield item
+        if elements:
+            for item in await loop.run_in_executor(self.executor, self._parse_items, elements):
+                yield item
+        self._finish()
+
+    def _feed(self, elements: List[ET.Element]) -> List[ET.Element]:
+        """
+        Parse the header from the root element when it arrives, returning the item elements
+        """
+        if elements and self._root is None:
+            self._parse_root(elements[0])
+            return elements[1:]
+        return elements
+
+
+class ElementWriter:
+    """
+    Incrementally write an XML document to a file or socket:
+    the root element is built from `header`, and each item
+    is serialized and written out as it is produced.
+    The output is the same as serializing the whole tree with `to_element`.
+
+    >>> with ElementWriter(path, header, tag="iati-activities") as writer:
+    ...     for activity in activities:
+    ...         writer.write(activity, tag="iati-activity")
+    """
+
+    def __init__(self, target: Union[str, os.PathLike, IO[bytes]], header: XmlBaseModel, tag: str, encoding: str = "us-ascii"):
+        self.encoding = encoding
+
+        self._close_file = isinstance(target, (str, os.PathLike))
+        self._file: Optional[IO[bytes]] = open(target, "wb") if isinstance(target, (str, os.PathLike)) else target
+
+        # Serialize the root with a placeholder for its content, to split out the start and end tags
+        root = header.to_element(tag_name=tag)
+        marker = f"__{id(self)}__"
+        root.text = marker
+        start, self._end = xml_backend.tostring(root, encoding=encoding).split(marker.encode(encoding))
+        self._file.write(start)
+
+    def write(self, item: XmlBaseModel, tag: Optional[str] = None):
+        if self._file is None:
+            raise ValueError("Writer is closed")
+        try:
+            # The document's declaration (if it needs one) was written with the root's start tag
+            content = xml_backend.tostring(item.to_element(tag_name=tag, check=False), encoding=self.encoding, xml_declaration=False)
         except Exception as E:
             raise ValueError from E
-        return el
+        self._file.write(content)
+
+    def close(self):
+        """
+        Write the closing tag
+        """
+        if self._file is None:
+            return
+        self._file.write(self._end)
+        if self._close_file:
+            self._file.close()
+        self._file = None
+
+    def __enter__(self) -> ElementWriter:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class FlyweightModel(XmlBaseModel):
+    """
+    A small model of a few plain values (or other `FlyweightModel`s), such as a narrative or a code.
+    When parsing with `compact`, identical instances are shared, and built as an immutable subclass
+    (see `frozen_model`). Models with list fields, such as a `narrative`, are never shared.
+    They are not copied when validated as part of another model
+    """
 
+    class Config:
+        copy_on_model_validation = False
 
-class Narrative(XmlBaseModel):
+
+class RecordModel(XmlBaseModel):
+    """
+    One of the repeated top-level records of a file, such as an activity.
+    When parsing with `errors`, invalid records are skipped and recorded,
+    identified by the field named by `Config.identifier_field`
+    """
+
+    class Config:
+        identifier_field: Optional[str] = None
+
+
+class Narrative(FlyweightModel):
     lang: Optional[XmlLanguageField]
     text: Optional[ThisElementTextField]
 
 
+# Generally the attribute name or xml tag name
+# is the field name replacing '_' -> '-'
+# The order here matters: a field uses the getter for the first type it subclasses
+XmlToModel.getters = (
+    (HttpUrl, XmlToModel.get_uri),
+    (Narrative, XmlToModel.get_narratives),
+    (TextField, XmlToModel.get_text),
+    (IntField, XmlToModel.get_text),
+    (XmlLanguageField, XmlToModel.get_language_field),
+    (ThisElementTextField, XmlToModel.get_element_text),
+    (DecimalText, XmlToModel.get_element_text),
+    (XmlBaseModel, XmlToModel.get_nested_xml),
+    (str, XmlToModel.get_attrib),
+    (bool, XmlToModel.get_attrib),
+    (int, XmlToModel.get_attrib),
+    (datetime, XmlToModel.get_attrib),
+    (date, XmlToModel.get_attrib),
+    (Decimal, XmlToModel.get_attrib),
+    (Enum, XmlToModel.get_attrib),
+)
+
+
 class IatiVersionEnum(str, Enum):
     v201 = "2.01"
     v202 = "2.02"
@@ -0,0 +1,203 @@
+"""
+Benchmarks for parsing, validation, serialization and JSON export
+over the bundled sample data and synthetically scaled copies of it.
+
+Run from the repository root, saving results to compare across commits:
+
+    python pydanticiati/benchmark.py --scale 10000 --output bench-$(git rev-parse --short HEAD).json
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import logging
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Type, Union
+
+import xml_backend
+from activity.models import IatiActivities, IatiActivitiesHeader
+from base_models import ElementWriter, Interner, XmlBaseModel
+from codelists.models import Codelist, CodelistItems
+from export import ndjson
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+SAMPLE = Path(__file__).parent / "data" / "sample"
+
+
+class BenchmarkDataset(BaseModel):
+    name: str
+    path: Path
+    # The models which can be benchmarked
+    model: Union[Type[IatiActivities], Type[Codelist]]
+
+    def count(self, parsed: XmlBaseModel) -> int:
+        """
+        The number of "items" (activities or codelist items) in the parsed data
+        """
+        if isinstance(parsed, IatiActivities):
+            return len(parsed.iati_activity)
+        if isinstance(parsed, Codelist):
+            return len(parsed.codelist_items.codelist_item)
+        raise ValueError(f"Can't benchmark {type(parsed).__name__}")
+
+
+class BenchmarkResult(BaseModel):
+    dataset: str
+    operation: str
+    items: int
+    megabytes: float
+    seconds: float
+    items_per_second: float
+    megabytes_per_second: float
+    peak_memory_megabytes: float
+
+
+def sample_datasets() -> List[BenchmarkDataset]:
+    return [
+        BenchmarkDataset(name="111111_publisher-activities", path=SAMPLE / "111111_publisher-activities.xml", model=IatiActivities),
+        BenchmarkDataset(name="activity-standard-example-annotated", path=SAMPLE / "activity-standard-example-annotated.xml", model=IatiActivities),
+        BenchmarkDataset(name="CRSChannelCode", path=SAMPLE / "CRSChannelCode.xml", model=Codelist),
+    ]
+
+
+def scaled(dataset: BenchmarkDataset, count: int, directory: Path) -> BenchmarkDataset:
+    """
+    Write a copy of a dataset with `count` activities (or codelist items),
+    repeating those in the original with unique identifiers
+    """
+    name = f"{dataset.name}-x{count}"
+    path = directory / f"{name}.xml"
+    if not path.exists():
+        parsed = dataset.model.from_file(dataset.path, verbose=False)
+        if isinstance(parsed, IatiActivities):
+            header = IatiActivitiesHeader(**parsed.dict(exclude={"iati_activity"}))
+            with ElementWriter(path, header, tag="iati-activities") as writer:
+                for n in range(count):
+                    activity = parsed.iati_activity[n % len(parsed.iati_activity)]
+                    writer.write(activity.copy(update={"iati_identifier": f"{activity.iati_identifier}-{n}"}), tag="iati-activity")
+        elif isinstance(parsed, Codelist):
+            items = parsed.codelist_items.codelist_item
+            items = [items[n % len(items)].copy(update={"code": f"{items[n % len(items)].code}-{n}"}) for n in range(count)]
+            scaled_codelist = parsed.copy(update={"codelist_items": CodelistItems(codelist_item=items)})
+            path.write_bytes(xml_backend.tostring(scaled_codelist.to_element()))
+        else:
+            raise ValueError(f"Can't benchmark {type(parsed).__name__}")
+    return BenchmarkDataset(name=name, path=path, model=dataset.model)
+
+
+def operations(dataset: BenchmarkDataset) -> Dict[str, Callable[[], Any]]:
+    """
+    The operations to time for a dataset. Their inputs are prepared here, outside the timings
+    """
+    parsed = dataset.model.from_file(dataset.path, verbose=False)
+    data = parsed.dict()
+    exported = ndjson.to_dict(parsed)
+    return {
+        "parse": lambda: dataset.model.from_file(dataset.path, verbose=False),
+        "parse_trusted": lambda: dataset.model.from_file(dataset.path, verbose=False, trusted=True),
+        "parse_interned": lambda: dataset.model.from_file(dataset.path, verbose=False, interner=Interner()),
+        "validate": lambda: dataset.model.parse_obj(data),
+        "serialize": lambda: xml_backend.tostring(parsed.to_element()),
+        "json": lambda: parsed.json(),
+        "json_fast": lambda: ndjson.dumps(parsed),
+        "load_trusted": lambda: ndjson.from_dict(dataset.model, exported, trusted=True),
+    }
+
+
+def measure(operation: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """
+    The best time of `repeat` runs, and the peak memory of one run traced separately
+    (tracing slows the operation down too much to time it at the same time)
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        operation()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": min(times), "peak_memory_megabytes": peak / 1e6}
+
+
+def run(datasets: List[BenchmarkDataset], only: Optional[List[str]] = None, repeat: int = 3) -> List[BenchmarkResult]:
+    results = []
+    for dataset in datasets:
+        megabytes = dataset.path.stat().st_size / 1e6
+        items = dataset.count(dataset.model.from_file(dataset.path, verbose=False))
+        for name, operation in operations(dataset).items():
+            if only and name not in only:
+                continue
+            measured = measure(operation, repeat)
+            result = BenchmarkResult(
+                dataset=dataset.name,
+                operation=name,
+                items=items,
+                megabytes=megabytes,
+                items_per_second=items / measured["seconds"],
+                megabytes_per_second=megabytes / measured["seconds"],
+                **measured,
+            )
+            logger.info(
+                f"{result.dataset:45} {result.operation:14} {result.items_per_second:10.1f} items/s"
+                f" {result.megabytes_per_second:7.2f} MB/s {result.peak_memory_megabytes:8.1f} MB peak"
+            )
+            results.append(result)
+    return results
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "xml_backend": xml_backend.name,
+    }
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark parsing, validation, serialization and JSON export")
+    parser.add_argument("--scale", type=int, nargs="*", default=[1000], help="Numbers of activities (or codelist items) in the synthetic datasets")
+    parser.add_argument("--only", nargs="*", help="Operations to run: parse, parse_trusted, parse_interned, validate, serialize, json, json_fast, load_trusted")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this file")
+    parser.add_argument("--workdir", type=Path, help="Where to keep the synthetic datasets (default: a temporary directory)")
+    options = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    warnings.simplefilter("ignore")
+
+    with tempfile.TemporaryDirectory() as temp:
+        workdir = options.workdir or Path(temp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        samples = sample_datasets()
+        datasets = samples + [scaled(dataset, count, workdir) for count in options.scale for dataset in samples]
+        results = run(datasets, only=options.only, repeat=options.repeat)
+
+    if options.output:
+        options.output.write_text(json.dumps({"environment": environment(), "results": [r.dict() for r in results]}, indent=1))
+    return results
+
+
+if __name__ == "__main__":
+    main()
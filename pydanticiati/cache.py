@@ -0,0 +1,170 @@
+"""
+An on-disk cache of parsed files, so that unchanged XML is only parsed once
+across separate jobs:
+
+>>> cache = ParseCache(max_bytes=2 ** 30)
+>>> activities = IatiActivities.from_file(path, cache=cache)
+
+Entries are pickled models (protocol 5), keyed by the SHA1 of the file's content,
+the cache `FORMAT_VERSION`, a fingerprint of the model classes' fields and the parse options.
+Trusted parses are kept apart from validated ones, since they skip validation,
+and `compact` parses from others, since they share instances between activities.
+The least recently used entries are removed once the cache is over `max_bytes`.
+"""
+from __future__ import annotations
+
+import gc
+import hashlib
+import logging
+import os
+import pickle
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Optional, Set, Type, Union
+
+from base_models import Projection, XmlBaseModel
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Change this when parsing changes in a way which the model fields don't show
+FORMAT_VERSION = 1
+
+DEFAULT_DIRECTORY = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "pydanticiati"
+
+# Options which don't change the parsed models
+IGNORED_OPTIONS = {"verbose"}
+
+# Options whose results can't be cached: codelist checks, unmapped content and error reports need to run, and lazy models hold on to elements
+UNCACHED_OPTIONS = {"codelists", "lazy", "unmapped", "errors"}
+
+
+def file_sha1(path: Union[str, os.PathLike]) -> str:
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(1 << 20), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def schema_fingerprint(model_class: Type[BaseModel]) -> str:
+    """
+    A hash of the names and types of the fields of a model, and of the models nested in it
+    """
+    parts = []
+    seen: Set[Type[BaseModel]] = set()
+
+    def walk(cls: Type[BaseModel]):
+        if cls in seen:
+            return
+        seen.add(cls)
+        parts.append(f"{cls.__module__}.{cls.__qualname__}")
+        for field in cls.__fields__.values():
+            parts.append(f"{field.name}:{field.outer_type_!r}:{field.required}")
+            if isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+                walk(field.type_)
+
+    walk(model_class)
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+class ParseCache:
+    """
+    A size-bounded, least-recently-used cache of parsed files in `directory`
+    """
+
+    def __init__(self, directory: Union[str, os.PathLike] = DEFAULT_DIRECTORY, max_bytes: int = 2 ** 30):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, model_class: Type[BaseModel], path: Union[str, os.PathLike], **options) -> str:
+        fields = options.get("fields")
+        parts = [
+            file_sha1(path),
+            str(FORMAT_VERSION),
+            schema_fingerprint(model_class),
+            repr(sorted(fields) if fields is not None else None),
+            # Trusted parsing doesn't validate, so its results are not valid for a validated parse
+            str(bool(options.get("trusted"))),
+            # Pickling keeps the instances shared by a compact parse shared
+            str(bool(options.get("compact"))),
+        ]
+        return hashlib.sha1(":".join(parts).encode()).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.pickle"
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self.path(key)
+        # Unpickling creates a great many objects, each of which would count towards
+        # triggering the cyclic garbage collector; none of them can be garbage yet
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            with open(path, "rb") as source:
+                model = pickle.load(source)
+        except FileNotFoundError:
+            return None
+        except Exception as E:
+            # A truncated or otherwise unreadable entry is a miss
+            logger.warning(f"Discarding cache entry {path}: {E!r}")
+            path.unlink(missing_ok=True)
+            return None
+        finally:
+            if collecting:
+                gc.enable()
+        # The modification time is used as the last access time
+        os.utime(path)
+        return model
+
+    def put(self, key: str, model: Any):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        # Write then rename, so that readers never see a partial entry
+        temp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp, "wb") as target:
+            pickle.dump(model, target, protocol=5)
+        temp.replace(path)
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in `max_bytes`
+        """
+        entries = []
+        for path in self.directory.glob("*.pickle"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for path in self.directory.glob("*.pickle"):
+            path.unlink(missing_ok=True)
+
+    def load(self, model_class: Type[XmlBaseModel], path: Union[str, os.PathLike], **options) -> XmlBaseModel:
+        """
+        The parsed file from the cache, or else parse it and add it to the cache
+        """
+        if UNCACHED_OPTIONS.intersection(option for option, value in options.items() if value) or isinstance(options.get("fields"), Projection):
+            # A compiled Projection doesn't keep the paths it was selected by, to key on
+            return model_class.from_file(path, **options)
+        key = self.key(model_class, path, **options)
+        model = self.get(key)
+        if model is not None:
+            self.hits += 1
+            return model
+        self.misses += 1
+        model = model_class.from_file(path, **options)
+        self.put(key, model)
+        return model
@@ -1,10 +1,8 @@
 from __future__ import annotations
 
 import os
-import xml.etree.ElementTree as ET
 from datetime import date
 from enum import Enum
-from pathlib import Path
 from typing import List, Optional
 
 from activity.models import Narratives
@@ -77,12 +75,6 @@ class Codelist(XmlBaseModel):
     complete: Optional[bool]
     embedded: Optional[bool]
 
-    @classmethod
-    def from_file(cls, path: Path):
-        element = ET.parse(path)
-        root = element.getroot()
-        return cls.from_element(root)
-
 
 def codelists(path):
     """
@@ -0,0 +1,293 @@
+"""
+A compiled codelist store in SQLite.
+
+Codelist XML is parsed once, by `build`, and looked up by (codelist name, code)
+afterwards without re-parsing anything at startup:
+
+    cd pydanticiati
+    python -m codelists.store build path/to/IATI-Codelists/xml
+
+>>> store = CodelistStore()
+>>> store.get("ActivityScope", "1").name.default.text
+'Global'
+>>> store.name("ActivityScope", "1", lang="fr")
+'Mondial'
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sqlite3
+import warnings
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterator, List, Optional, Set, Union
+
+import xml_backend
+from base_models import Narrative
+from codelists.models import CategoryNarratives, Codelist, CodelistItem, DescriptionNarratives, NameNarratives
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = Path(__file__).parent.parent / "codelists.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS codelist (
+    name TEXT PRIMARY KEY,
+    ref TEXT,
+    lang TEXT,
+    complete INTEGER,
+    embedded INTEGER,
+    category_codelist TEXT
+);
+CREATE TABLE IF NOT EXISTS codelist_item (
+    codelist TEXT NOT NULL REFERENCES codelist (name) ON DELETE CASCADE,
+    code TEXT NOT NULL,
+    url TEXT,
+    public_database INTEGER,
+    status TEXT,
+    activation_date TEXT,
+    withdrawal_date TEXT,
+    -- The narrative fields present on the item, which may have no narratives in them
+    narrative_fields TEXT NOT NULL,
+    PRIMARY KEY (codelist, code)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS narrative (
+    codelist TEXT NOT NULL,
+    code TEXT NOT NULL,
+    field TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    lang TEXT,
+    text TEXT,
+    PRIMARY KEY (codelist, code, field, position),
+    FOREIGN KEY (codelist, code) REFERENCES codelist_item (codelist, code) ON DELETE CASCADE
+) WITHOUT ROWID;
+"""
+
+# The narrative fields of a codelist item, and the model they are held in
+NARRATIVE_FIELDS = {"name": NameNarratives, "description": DescriptionNarratives, "category": CategoryNarratives}
+
+
+class CodelistStore:
+    """
+    Indexed (codelist name, code) -> `CodelistItem` lookups, backed by SQLite.
+    The database is only opened on first use, and items are only built when they are looked up.
+    Lookups open it read-only; it is only written to (and created) by `add` and `build`
+    """
+
+    def __init__(self, path: Union[str, os.PathLike] = DEFAULT_PATH):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._writable = False
+        self.get = lru_cache(maxsize=4096)(self._get)  # type: ignore
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        A read-only connection, unless the store has been written to
+        """
+        if self._connection is None:
+            try:
+                connection = sqlite3.connect(f"{Path(self.path).resolve().as_uri()}?mode=ro", uri=True)
+                built = connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'codelist'").fetchone()
+            except sqlite3.OperationalError:
+                built = None
+            if not built:
+                raise ValueError(f"{self.path} is not a codelist store: build it with `python -m codelists.store build`")
+            self._connection = connection
+        return self._connection
+
+    @property
+    def writable_connection(self) -> sqlite3.Connection:
+        """
+        A connection for writing, creating the tables if they don't exist
+        """
+        if not self._writable:
+            self.close()
+            self._connection = sqlite3.connect(self.path)
+            self._connection.execute("PRAGMA foreign_keys = ON")
+            self._connection.executescript(SCHEMA)
+            self._writable = True
+        assert self._connection is not None
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        self._writable = False
+
+    def __enter__(self) -> CodelistStore:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, codelist: Codelist):
+        """
+        Add (or replace) a codelist
+        """
+        with self.writable_connection as connection:
+            connection.execute("DELETE FROM codelist WHERE name = ?", (codelist.name,))
+            connection.execute(
+                "INSERT INTO codelist VALUES (?, ?, ?, ?, ?, ?)",
+                (codelist.name, codelist.ref, codelist.lang, codelist.complete, codelist.embedded, codelist.category_codelist),
+            )
+            items = codelist.codelist_items.codelist_item
+            connection.executemany(
+                "INSERT OR REPLACE INTO codelist_item VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        codelist.name,
+                        item.code,
+                        item.url,
+                        item.public_database,
+                        item.status.value if item.status else None,
+                        item.activation_date.isoformat() if item.activation_date else None,
+                        item.withdrawal_date.isoformat() if item.withdrawal_date else None,
+                        ",".join(field for field in NARRATIVE_FIELDS if getattr(item, field)),
+                    )
+                    for item in items
+                ],
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO narrative VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (codelist.name, item.code, field, position, narrative.lang, narrative.text)
+                    for item in items
+                    for field in NARRATIVE_FIELDS
+                    if getattr(item, field)
+                    for position, narrative in enumerate(getattr(item, field).narrative)
+                ],
+            )
+        self.get.cache_clear()  # type: ignore
+
+    def build(self, directory: Union[str, os.PathLike]) -> List[str]:
+        """
+        Ingest every codelist XML file in a directory, returning the names added.
+        Other XML files are skipped
+        """
+        added = []
+        for path in sorted(Path(directory).glob("*.xml")):
+            if xml_backend.root_tag(path) != "codelist":
+                logger.info(f"Skipping {path}, which is not a codelist")
+                continue
+            codelist = Codelist.from_file(path)
+            self.add(codelist)
+            added.append(codelist.name)
+        return added
+
+    def names(self) -> List[str]:
+        return [name for (name,) in self.connection.execute("SELECT name FROM codelist ORDER BY name")]
+
+    def codes(self, codelist: str) -> FrozenSet[str]:
+        return frozenset(code for (code,) in self.connection.execute("SELECT code FROM codelist_item WHERE codelist = ?", (codelist,)))
+
+    def _narratives(self, codelist: str, code: str) -> Dict[str, List[Narrative]]:
+        narratives: Dict[str, List[Narrative]] = {}
+        rows = self.connection.execute("SELECT field, lang, text FROM narrative WHERE codelist = ? AND code = ? ORDER BY field, position", (codelist, code))
+        for field, lang, text in rows:
+            narratives.setdefault(field, []).append(Narrative(lang=lang, text=text))
+        return narratives
+
+    def _get(self, codelist: str, code: str) -> Optional[CodelistItem]:
+        row = self.connection.execute(
+            "SELECT url, public_database, status, activation_date, withdrawal_date, narrative_fields FROM codelist_item WHERE codelist = ? AND code = ?",
+            (codelist, code),
+        ).fetchone()
+        if row is None:
+            return None
+        url, public_database, status, activation_date, withdrawal_date, narrative_fields = row
+        narratives = self._narratives(codelist, code)
+        return CodelistItem(
+            code=code,
+            url=url,
+            public_database=public_database,
+            status=status,
+            activation_date=activation_date,
+            withdrawal_date=withdrawal_date,
+            **{field: NARRATIVE_FIELDS[field](narrative=narratives.get(field, [])) for field in narrative_fields.split(",") if field},
+        )
+
+    def name(self, codelist: str, code: str, lang: Optional[str] = None) -> Optional[str]:
+        """
+        The name of a code in a language; `None` for the default language
+        """
+        row = self.connection.execute(
+            "SELECT text FROM narrative WHERE codelist = ? AND code = ? AND field = 'name' AND lang IS ? ORDER BY position", (codelist, code, lang)
+        ).fetchone()
+        return row[0] if row else None
+
+    def items(self, codelist: str) -> Iterator[CodelistItem]:
+        for (code,) in self.connection.execute("SELECT code FROM codelist_item WHERE codelist = ? ORDER BY code", (codelist,)):
+            item = self.get(codelist, code)
+            if item:
+                yield item
+
+
+class CodelistIndex:
+    """
+    The codes of each codelist as in-memory frozensets,
+    for O(1) checks of `CodelistValue` fields while parsing:
+
+    >>> IatiActivities.from_file(path, codelists=default_index())
+
+    Fields of codelists which are not in the index can't be checked:
+    there is a warning the first time each of these is looked up
+    """
+
+    def __init__(self, codes: Dict[str, FrozenSet[str]]):
+        self._codes = codes
+        self._missing: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    @classmethod
+    def from_store(cls, store: CodelistStore) -> CodelistIndex:
+        codes: Dict[str, set] = {}
+        for codelist, code in store.connection.execute("SELECT codelist, code FROM codelist_item"):
+            codes.setdefault(codelist, set()).add(code)
+        return cls({codelist: frozenset(items) for codelist, items in codes.items()})
+
+    def codes(self, codelist: str) -> Optional[FrozenSet[str]]:
+        """
+        The codes in a codelist, or None for a codelist which is not indexed
+        """
+        codes = self._codes.get(codelist)
+        if codes is None and codelist not in self._missing:
+            self._missing.add(codelist)
+            warnings.warn(f"The {codelist} codelist is not indexed, so its values are not checked")
+        return codes
+
+
+@lru_cache(maxsize=None)
+def default_index(path: Union[str, os.PathLike] = DEFAULT_PATH) -> CodelistIndex:
+    """
+    The index of a codelist store, loaded once per process.
+    Raises ValueError if the store has not been built
+    """
+    with CodelistStore(path) as store:
+        index = CodelistIndex.from_store(store)
+    if not len(index):
+        raise ValueError(f"{path} has no codelists: build it with `python -m codelists.store build`")
+    return index
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Compile codelist XML into a SQLite codelist store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Ingest a directory of codelist XML files")
+    build.add_argument("directory")
+    build.add_argument("--db", default=DEFAULT_PATH, help="Path to the SQLite database")
+    options = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO)
+    with CodelistStore(options.db) as store:
+        added = store.build(options.directory)
+    logger.info(f"Added {len(added)} codelists to {options.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Flatten activities into columnar tables: transactions, budgets, planned disbursements,
+sectors, participating orgs and results, one row per item with the activity's identifier.
+
+Rows are gathered into batches of typed columns and written out incrementally
+as Parquet or Arrow IPC files, one file per table:
+
+>>> with ColumnarWriter("out/", format="parquet") as writer:
+...     writer.write(IatiActivities.iter_file(path))
+
+Money and percentages are decimals, dates are date32 and codes are dictionary-encoded strings.
+Writing needs `pyarrow`; `ColumnBatch` can be used to flatten activities without it.
+"""
+from __future__ import annotations
+
+import os
+from datetime import date
+from decimal import Decimal
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from activity.models import IatiActivity, IsoDateModel, Narratives, Value
+from base_models import Narrative, XmlBaseModel
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = pq = None
+
+# Decimal columns are decimal128 with this precision and scale:
+# values with more decimal places than `DECIMAL_SCALE` raise rather than being rounded
+DECIMAL_PRECISION = 38
+DECIMAL_SCALE = 6
+
+# The kinds of column, and their Arrow types
+STRING = "string"
+CODE = "code"
+DECIMAL = "decimal"
+DATE = "date"
+INTEGER = "integer"
+BOOLEAN = "boolean"
+
+
+def arrow_type(kind: str):
+    return {
+        STRING: pa.string(),
+        CODE: pa.dictionary(pa.int32(), pa.string()),
+        DECIMAL: pa.decimal128(DECIMAL_PRECISION, DECIMAL_SCALE),
+        DATE: pa.date32(),
+        INTEGER: pa.int64(),
+        BOOLEAN: pa.bool_(),
+    }[kind]
+
+
+def _code(model: Optional[Union[XmlBaseModel, Enum]]) -> Optional[Any]:
+    """
+    The `code` of an optional code-only model such as `FlowType`, or an enum's value
+    """
+    value = getattr(model, "code", None) if isinstance(model, XmlBaseModel) else model
+    return value.value if isinstance(value, Enum) else value
+
+
+def _iso_date(model: Optional[IsoDateModel]) -> Optional[date]:
+    return model.iso_date if model else None
+
+
+def _text(narratives: Optional[Union[Narratives, List[Narrative]]]) -> Optional[str]:
+    """
+    The text of the default (or else the first) narrative
+    """
+    if isinstance(narratives, Narratives):
+        narratives = narratives.narrative
+    if not narratives:
+        return None
+    default = next((n for n in narratives if n.lang is None), narratives[0])
+    return default.text
+
+
+def _money(value: Value, activity: IatiActivity) -> Tuple[Optional[date], Optional[str], Decimal]:
+    # The value's currency, falling back to the activity's default currency
+    return value.value_date, value.currency or activity.default_currency, Decimal(value.amount)
+
+
+class Table:
+    """
+    A flattened table: its columns (name, kind) and
+    a function returning the rows (tuples in column order) for an activity.
+    Every table starts with the activity's identifier and reporting org
+    """
+
+    __slots__ = ("name", "columns", "rows")
+
+    def __init__(self, name: str, columns: List[Tuple[str, str]], rows: Callable[[IatiActivity], Iterable[tuple]]):
+        self.name = name
+        self.columns = [("iati_identifier", STRING), ("reporting_org_ref", CODE)] + columns
+        self.rows = rows
+
+    def schema(self):
+        return pa.schema([(name, arrow_type(kind)) for name, kind in self.columns])
+
+
+def transaction_rows(activity: IatiActivity) -> Iterator[tuple]:
+    for transaction in activity.transaction:
+        yield (
+            transaction.ref,
+            _code(transaction.transaction_type),
+            _iso_date(transaction.transaction_date),
+            *_money(transaction.value, activity),
+            transaction.provider_org.ref if transaction.provider_org else None,
+            transaction.receiver_org.ref if transaction.receiver_org else None,
+            _code(transaction.flow_type),
+            _code(transaction.finance_type),
+            _code(transaction.tied_status),
+            _code(transaction.disbursement_channel),
+            _code(transaction.recipient_country),
+            _code(transaction.recipient_region),
+            transaction.humanitarian,
+        )
+
+
+def budget_rows(activity: IatiActivity) -> Iterator[tuple]:
+    for budget in activity.budget:
+        yield budget.type, budget.status, _iso_date(budget.period_start), _iso_date(budget.period_end), *_money(budget.value, activity)
+
+
+def planned_disbursement_rows(activity: IatiActivity) -> Iterator[tuple]:
+    for disbursement in activity.planned_disbursement:
+        yield (
+            disbursement.type_,
+            _iso_date(disbursement.period_start),
+            _iso_date(disbursement.period_end),
+            *_money(disbursement.value, activity),
+            disbursement.provider_org.ref if disbursement.provider_org else None,
+            disbursement.receiver_org.ref if disbursement.receiver_org else None,
+        )
+
+
+def sector_rows(activity: IatiActivity) -> Iterator[tuple]:
+    for sector in activity.sector:
+        yield sector.vocabulary, sector.code, sector.percentage
+
+
+def participating_org_rows(activity: IatiActivity) -> Iterator[tuple]:
+    for org in activity.participating_org:
+        yield org.ref, _code(org.role), _code(org.type), org.activity_id, org.crs_channel_code, _text(org.narrative)
+
+
+def result_rows(activity: IatiActivity) -> Iterator[tuple]:
+    """
+    One row for each target and actual value of each indicator period
+    """
+    for result in activity.result:
+        for indicator in result.indicator:
+            period = indicator.period
+            values = [("target", target.value) for target in period.target] + [("actual", actual.value) for actual in period.actual]
+            for kind, value in values:
+                yield (
+                    result.type_,
+                    _text(result.title),
+                    _text(indicator.title),
+                    indicator.measure,
+                    _iso_date(period.period_start),
+                    _iso_date(period.period_end),
+                    kind,
+                    value,
+                )
+
+
+MONEY = [("value_date", DATE), ("currency", CODE), ("amount", DECIMAL)]
+
+TABLES = {
+    table.name: table
+    for table in [
+        Table(
+            "transactions",
+            [("ref", STRING), ("transaction_type", CODE), ("transaction_date", DATE)]
+            + MONEY
+            + [
+                ("provider_org_ref", CODE),
+                ("receiver_org_ref", CODE),
+                ("flow_type", CODE),
+                ("finance_type", CODE),
+                ("tied_status", CODE),
+                ("disbursement_channel", CODE),
+                ("recipient_country", CODE),
+                ("recipient_region", CODE),
+                ("humanitarian", BOOLEAN),
+            ],
+            transaction_rows,
+        ),
+        Table("budgets", [("type", INTEGER), ("status", INTEGER), ("period_start", DATE), ("period_end", DATE)] + MONEY, budget_rows),
+        Table(
+            "planned_disbursements",
+            [("type", CODE), ("period_start", DATE), ("period_end", DATE)] + MONEY + [("provider_org_ref", CODE), ("receiver_org_ref", CODE)],
+            planned_disbursement_rows,
+        ),
+        Table("sectors", [("vocabulary", CODE), ("code", CODE), ("percentage", DECIMAL)], sector_rows),
+        Table(
+            "participating_orgs",
+            [("ref", CODE), ("role", INTEGER), ("type", INTEGER), ("activity_id", STRING), ("crs_channel_code", CODE), ("name", STRING)],
+            participating_org_rows,
+        ),
+        Table(
+            "results",
+            [
+                ("result_type", CODE),
+                ("result_title", STRING),
+                ("indicator_title", STRING),
+                ("indicator_measure", CODE),
+                ("period_start", DATE),
+                ("period_end", DATE),
+                ("value_type", CODE),
+                ("value", STRING),
+            ],
+            result_rows,
+        ),
+    ]
+}
+
+
+class CodeDictionary:
+    """
+    The distinct values of a CODE column, in order of first appearance.
+    Batches written to the same file share one, so that each batch's dictionary
+    extends the one before it (and can be written as a delta) rather than replacing it
+    """
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.codes: List[str] = []
+
+    def encode(self, column: List[Optional[str]]):
+        """
+        A `pyarrow.DictionaryArray` of the column, over every code seen so far
+        """
+        indices: List[Optional[int]] = []
+        for value in column:
+            if value is None:
+                indices.append(None)
+                continue
+            position = self.index.get(value)
+            if position is None:
+                position = self.index[value] = len(self.codes)
+                self.codes.append(value)
+            indices.append(position)
+        return pa.DictionaryArray.from_arrays(pa.array(indices, type=pa.int32()), pa.array(self.codes, type=pa.string()))
+
+
+class ColumnBatch:
+    """
+    The rows of one table for a number of activities, held as a list per column
+    """
+
+    def __init__(self, table: Table):
+        self.table = table
+        self.columns: List[List[Any]] = [[] for _ in table.columns]
+
+    def __len__(self) -> int:
+        return len(self.columns[0])
+
+    def add(self, activity: IatiActivity):
+        prefix = (activity.iati_identifier, activity.reporting_org.ref if activity.reporting_org else None)
+        for row in self.table.rows(activity):
+            for column, value in zip(self.columns, prefix + row):
+                column.append(value)
+
+    def to_dict(self) -> Dict[str, List[Any]]:
+        return {name: column for (name, _), column in zip(self.table.columns, self.columns)}
+
+    def to_arrow(self, dictionaries: Optional[Dict[str, CodeDictionary]] = None):
+        """
+        Build a `pyarrow.RecordBatch` with the table's column types.
+        `dictionaries` holds the codes of each CODE column, by name, for batches written to the same file;
+        it is updated with this batch's new codes
+        """
+        if dictionaries is None:
+            dictionaries = {}
+        arrays = []
+        for (name, kind), column in zip(self.table.columns, self.columns):
+            if kind == CODE:
+                arrays.append(dictionaries.setdefault(name, CodeDictionary()).encode(column))
+            else:
+                arrays.append(pa.array(column, type=arrow_type(kind)))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.table.schema())
+
+
+def flatten(activities: Iterable[IatiActivity], tables: Iterable[str] = tuple(TABLES), batch_size: int = 10000) -> Iterator[ColumnBatch]:
+    """
+    Yield batches of (up to about) `batch_size` rows per table as the activities are read,
+    and any remaining rows at the end
+    """
+    batches = {name: ColumnBatch(TABLES[name]) for name in tables}
+    for activity in activities:
+        for name, batch in batches.items():
+            batch.add(activity)
+            if len(batch) >= batch_size:
+                yield batch
+                batches[name] = ColumnBatch(TABLES[name])
+    for batch in batches.values():
+        if len(batch):
+            yield batch
+
+
+class ColumnarWriter:
+    """
+    Write flattened activities to `directory`, as one Parquet (or Arrow IPC) file per table,
+    a batch at a time. Every table's file is written, even with no rows
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, os.PathLike],
+        tables: Iterable[str] = tuple(TABLES),
+        format: str = "parquet",
+        batch_size: int = 10000,
+    ):
+        if pa is None:
+            raise ImportError("pyarrow is required to write columnar output")
+        if format not in ("parquet", "arrow"):
+            raise ValueError(f"Unknown format {format}, expected parquet or arrow")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.tables = list(tables)
+        self.format = format
+        self.batch_size = batch_size
+        self._writers: Dict[str, Any] = {}
+        # The codes of each table's CODE columns, shared by every batch in its file
+        self._dictionaries: Dict[str, Dict[str, CodeDictionary]] = {}
+
+    def path(self, table: str) -> Path:
+        return self.directory / f"{table}.{self.format}"
+
+    def _writer(self, table: str):
+        if table not in self._writers:
+            schema = TABLES[table].schema()
+            if self.format == "parquet":
+                self._writers[table] = pq.ParquetWriter(self.path(table), schema)
+            else:
+                # The IPC file format can't replace a dictionary, but it can extend one
+                self._writers[table] = pa.ipc.new_file(self.path(table), schema, options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+            self._dictionaries[table] = {}
+        return self._writers[table]
+
+    def write(self, activities: Iterable[IatiActivity]):
+        for batch in flatten(activities, self.tables, self.batch_size):
+            name = batch.table.name
+            writer = self._writer(name)
+            writer.write_batch(batch.to_arrow(self._dictionaries[name]))
+
+    def close(self):
+        for table in self.tables:
+            self._writer(table).close()
+        self._writers = {}
+        self._dictionaries = {}
+
+    def __enter__(self) -> ColumnarWriter:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,266 @@
+"""
+Fast JSON export of parsed models, and NDJSON (one activity per line) for search indexers:
+
+>>> with NdjsonWriter("activities.ndjson") as writer:
+...     writer.write(IatiActivities.iter_file(path))
+
+and the way back, without going through XML:
+
+>>> activities = list(NdjsonReader("activities.ndjson", IatiActivity, trusted=True))
+
+The output is the same as `json.loads(model.json())`: decimals become numbers
+(integers when they have no decimal places), dates ISO strings and enums their values. Rather than pydantic's `json()`, which walks
+every model with `dict()` and then encodes each value through a generic `default=` function,
+a "dump plan" of the converter for each field is compiled once per model class.
+
+orjson is used to encode when it is installed, falling back to the standard library's `json`.
+"""
+from __future__ import annotations
+
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from types import ModuleType
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
+
+from base_models import DeferredField, XmlBaseModel, XmlToModel
+from pydantic import BaseModel, fields
+from pydantic.json import decimal_encoder, pydantic_encoder
+
+orjson: Optional[ModuleType]
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+Converter = Optional[Callable[[Any], Any]]
+
+
+def _isoformat(value: date) -> str:
+    return value.isoformat()
+
+
+def _enum_value(value: Enum) -> Any:
+    return value.value
+
+
+def _encoded(value: Any) -> Any:
+    # Types without a converter of their own: as pydantic would encode them
+    return json.loads(json.dumps(value, default=pydantic_encoder))
+
+
+def _each(convert: Callable[[Any], Any]) -> Callable[[List[Any]], List[Any]]:
+    return lambda values: [convert(value) for value in values]
+
+
+class DumpPlan:
+    """
+    How to convert each field of a model class to JSON types:
+    a converter per field, or None where the value is used as it is
+    """
+
+    __slots__ = ("model_class", "fields", "deferred")
+
+    def __init__(self, model_class: Type[BaseModel]):
+        self.model_class = model_class
+        self.fields: List[Tuple[str, Converter]] = [(field.name, self.converter(field)) for field in model_class.__fields__.values()]
+        # Fields of lazily parsed models, which are read through their descriptor to parse them
+        self.deferred = frozenset(name for name, _ in self.fields if isinstance(getattr(model_class, name, None), DeferredField))
+
+    @staticmethod
+    def converter(field: fields.ModelField) -> Converter:
+        type_ = field.type_
+        if isinstance(type_, type) and issubclass(type_, BaseModel):
+            convert: Converter = to_dict
+        elif isinstance(type_, type) and issubclass(type_, Enum):
+            convert = _enum_value
+        elif isinstance(type_, type) and issubclass(type_, (str, bool, int)):
+            convert = None
+        elif isinstance(type_, type) and issubclass(type_, Decimal):
+            convert = decimal_encoder
+        elif isinstance(type_, type) and issubclass(type_, (date, datetime)):
+            convert = _isoformat
+        else:
+            convert = _encoded
+        if field.shape == fields.SHAPE_SINGLETON or convert is None:
+            return convert
+        if field.shape == fields.SHAPE_LIST:
+            return _each(convert)
+        return _encoded
+
+
+_dump_plans: Dict[Type[BaseModel], DumpPlan] = {}
+
+
+def dump_plan(model_class: Type[BaseModel]) -> DumpPlan:
+    """
+    Return the (cached) dump plan for a model class
+    """
+    try:
+        return _dump_plans[model_class]
+    except KeyError:
+        plan = _dump_plans[model_class] = DumpPlan(model_class)
+        return plan
+
+
+def to_dict(model: BaseModel) -> Dict[str, Any]:
+    """
+    A model as JSON types, equal to `json.loads(model.json())`
+    """
+    plan = dump_plan(type(model))
+    values = model.__dict__
+    data = {}
+    for name, convert in plan.fields:
+        value = getattr(model, name) if name in plan.deferred else values[name]
+        data[name] = value if convert is None or value is None else convert(value)
+    return data
+
+
+def dumps(model: BaseModel) -> bytes:
+    """
+    A model as compact JSON, on one line
+    """
+    if orjson is not None:
+        return orjson.dumps(to_dict(model))
+    return json.dumps(to_dict(model), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def iter_lines(models: Iterable[BaseModel]) -> Iterator[bytes]:
+    """
+    NDJSON: each model as a line of JSON
+    """
+    for model in models:
+        yield dumps(model) + b"\n"
+
+
+class NdjsonWriter:
+    """
+    Write models (usually activities) to a file or binary stream, one per line
+    """
+
+    def __init__(self, target: Union[str, os.PathLike, IO[bytes]]):
+        self._own_file = isinstance(target, (str, os.PathLike))
+        self._file: IO[bytes] = open(target, "wb") if self._own_file else target  # type: ignore
+        self.count = 0
+
+    def write(self, models: Iterable[XmlBaseModel]) -> int:
+        """
+        Write models, returning how many were written
+        """
+        written = 0
+        for line in iter_lines(models):
+            self._file.write(line)
+            written += 1
+        self.count += written
+        return written
+
+    def close(self):
+        if self._own_file:
+            self._file.close()
+
+    def __enter__(self) -> NdjsonWriter:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class LoadPlan:
+    """
+    How to convert each field of a model class back from JSON types, without validation:
+    nested models are loaded in turn, and other values use the `trusted` parsing coercers
+    """
+
+    __slots__ = ("model_class", "fields", "names")
+
+    def __init__(self, model_class: Type[BaseModel]):
+        self.model_class = model_class
+        self.names = frozenset(model_class.__fields__)
+        self.fields: List[Tuple[str, Callable[[Any], Any]]] = []
+        for field in XmlToModel.plan_for(model_class).fields:
+            convert = self.converter(field.field) or field.coerce
+            if convert is not None:
+                self.fields.append((field.name, convert))
+
+    @staticmethod
+    def converter(field: fields.ModelField) -> Converter:
+        """
+        The loader for a nested model field; None for other fields
+        """
+        type_ = field.type_
+        if not (isinstance(type_, type) and issubclass(type_, BaseModel)):
+            return None
+        if field.shape == fields.SHAPE_SINGLETON:
+            return lambda value: from_dict(type_, value, trusted=True)
+        if field.shape == fields.SHAPE_LIST:
+            return lambda values: [from_dict(type_, value, trusted=True) for value in values]
+        return None
+
+
+_load_plans: Dict[Type[BaseModel], LoadPlan] = {}
+
+
+def load_plan(model_class: Type[BaseModel]) -> LoadPlan:
+    """
+    Return the (cached) load plan for a model class
+    """
+    try:
+        return _load_plans[model_class]
+    except KeyError:
+        plan = _load_plans[model_class] = LoadPlan(model_class)
+        return plan
+
+
+def from_dict(model_class: Type[BaseModel], data: Dict[str, Any], trusted: bool = False) -> BaseModel:
+    """
+    Rebuild a model from `to_dict` output (or `model.dict()`).
+    `trusted` skips pydantic validation for data known to be valid, such as data we exported ourselves:
+    values are only converted to their field types, and models are built with `construct`
+    """
+    if not trusted:
+        return model_class.parse_obj(data)
+    plan = load_plan(model_class)
+    values = dict(data)
+    for name, convert in plan.fields:
+        value = values.get(name)
+        if value is not None:
+            values[name] = convert(value)
+    if values.keys() != plan.names or model_class.__private_attributes__:
+        return model_class.construct(**values)
+    # Every field is there (as it is in `to_dict` output), so there are no defaults to fill in
+    model = model_class.__new__(model_class)
+    object.__setattr__(model, "__dict__", values)
+    object.__setattr__(model, "__fields_set__", set(plan.names))
+    return model
+
+
+def loads(model_class: Type[BaseModel], line: Union[str, bytes], trusted: bool = False) -> BaseModel:
+    """
+    Rebuild a model from a line of JSON
+    """
+    return from_dict(model_class, orjson.loads(line) if orjson is not None else json.loads(line), trusted=trusted)
+
+
+class NdjsonReader:
+    """
+    Read models back from NDJSON, one per line, as they are iterated over. Blank lines are skipped
+    """
+
+    def __init__(self, source: Union[str, os.PathLike, IO[bytes]], model_class: Type[BaseModel], trusted: bool = False):
+        self.source = source
+        self.model_class = model_class
+        self.trusted = trusted
+
+    def __iter__(self) -> Iterator[BaseModel]:
+        if isinstance(self.source, (str, os.PathLike)):
+            with open(self.source, "rb") as source:
+                yield from self._read(source)
+        else:
+            yield from self._read(self.source)
+
+    def _read(self, source: IO[bytes]) -> Iterator[BaseModel]:
+        for line in source:
+            if line.strip():
+                yield loads(self.model_class, line, trusted=self.trusted)
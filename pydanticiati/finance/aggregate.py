@@ -0,0 +1,242 @@
+"""
+Vectorized totals of transaction values.
+
+Transactions are packed once into NumPy arrays, one per column, and totalled
+with a sort and `numpy.add.reduceat` rather than a Python loop per transaction:
+
+>>> table = TransactionTable.from_activities(IatiActivities.iter_file(path))
+>>> table.sum(by=["transaction_type", "currency"])
+{('1', 'EUR'): Decimal('1000'), ...}
+>>> table.sum(by=["year", "currency"])
+>>> table.sum_by_sector(by=["currency"], vocabulary="1")
+
+Totals are exact: amounts are held as int64 multiples of `10 ** -scale`
+and converted back to `Decimal`. When the amounts are too large (or too precise)
+for that, they are held as `Decimal` objects instead, which is slower but still exact.
+"""
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from activity.models import IatiActivity, Transaction
+
+# Largest total which can be held in an int64
+INT64_LIMIT = 2 ** 63 - 1
+
+
+class CodeColumn:
+    """
+    A column of codes (or other hashable values, including None),
+    held as integer indexes into the list of distinct values
+    """
+
+    __slots__ = ("indexes", "values")
+
+    def __init__(self, items: Iterable[Any]):
+        lookup: Dict[Any, int] = {}
+        self.indexes = np.fromiter((lookup.setdefault(item, len(lookup)) for item in items), dtype=np.int64)
+        self.values = list(lookup)
+
+    def __len__(self) -> int:
+        return len(self.indexes)
+
+    def values_at(self, indexes: np.ndarray) -> List[Any]:
+        return [self.values[i] for i in indexes]
+
+    def subset(self, rows: np.ndarray) -> CodeColumn:
+        subset = CodeColumn(())
+        subset.indexes = self.indexes[rows]
+        subset.values = self.values
+        return subset
+
+
+class Amounts:
+    """
+    Exact decimal amounts: int64 multiples of `10 ** -scale` if they fit,
+    otherwise `Decimal` objects (`scale` is None)
+    """
+
+    __slots__ = ("array", "scale")
+
+    def __init__(self, array: np.ndarray, scale: Optional[int]):
+        self.array = array
+        self.scale = scale
+
+    @classmethod
+    def pack(cls, amounts: Sequence[Decimal]) -> Amounts:
+        # The exponent is only a string for NaN and infinities, which can't be totalled anyway
+        scale = max([-exponent for exponent in (amount.as_tuple().exponent for amount in amounts) if isinstance(exponent, int)] + [0])
+        scaled = [int(amount.scaleb(scale)) for amount in amounts]
+        # Room for the total of every amount, not just for each one
+        if max(map(abs, scaled), default=0) * max(len(scaled), 1) <= INT64_LIMIT:
+            return cls(np.array(scaled, dtype=np.int64), scale)
+        return cls(np.array(amounts, dtype=object), None)
+
+    def unpack(self, total: Any) -> Decimal:
+        if self.scale is None:
+            return total
+        return Decimal(int(total)).scaleb(-self.scale)
+
+    def times(self, rows: np.ndarray, percentages: Amounts) -> Amounts:
+        """
+        The amounts in `rows` multiplied by percentages (and divided by 100)
+        """
+        if self.scale is not None and percentages.scale is not None:
+            amounts, factors = self.array[rows], percentages.array
+            largest = int(np.abs(amounts).max(initial=0)) * int(np.abs(factors).max(initial=0))
+            if largest * max(len(rows), 1) <= INT64_LIMIT:
+                return Amounts(amounts * factors, self.scale + percentages.scale + 2)
+        amounts, factors = self.decimals()[rows], percentages.decimals()
+        return Amounts(amounts * factors / 100, None)
+
+    def decimals(self) -> np.ndarray:
+        if self.scale is None:
+            return self.array
+        return np.array([Decimal(int(amount)).scaleb(-self.scale) for amount in self.array], dtype=object)
+
+
+def group_sum(keys: List[CodeColumn], amounts: Amounts, rows: Optional[np.ndarray] = None) -> Dict[Tuple, Decimal]:
+    """
+    Total `amounts` for each distinct combination of `keys`, by sorting on the keys
+    and summing each run of equal keys with `add.reduceat`.
+    `rows` selects the rows of `keys` the amounts are for (by default, all of them)
+    """
+    indexes = [key.indexes if rows is None else key.indexes[rows] for key in keys]
+    if not len(amounts.array):
+        return {}
+    if not keys:
+        return {(): amounts.unpack(amounts.array.sum())}
+
+    order = np.lexsort(indexes[::-1])
+    ordered = np.stack([index[order] for index in indexes])
+    # Where any key changes from the row before
+    starts = np.concatenate([[0], np.flatnonzero((ordered[:, 1:] != ordered[:, :-1]).any(axis=0)) + 1])
+    totals = np.add.reduceat(amounts.array[order], starts)
+    groups = zip(*[key.values_at(ordered[n, starts]) for n, key in enumerate(keys)])
+    return {group: amounts.unpack(total) for group, total in zip(groups, totals)}
+
+
+class TransactionTable:
+    """
+    The transactions of a set of activities, as NumPy arrays.
+    Columns which can be grouped `by`:
+
+    - `iati_identifier`, `reporting_org`: of the activity
+    - `transaction_type`, `recipient_country`, `recipient_region`, `flow_type`, `finance_type`, `aid_type` (the first one)
+    - `currency`: the value's currency, or else the activity's `default_currency`
+    - `year`: of the `transaction_date`; `value_year`: of the `value_date`
+
+    `transaction_date` and `value_date` are also available as `datetime64[D]` arrays
+    """
+
+    def __init__(self, columns: Dict[str, CodeColumn], dates: Dict[str, np.ndarray], amounts: Amounts, sectors: Dict[str, Any]):
+        self.columns = columns
+        self.dates = dates
+        self.amounts = amounts
+        self._sectors = sectors
+
+    def __len__(self) -> int:
+        return len(self.amounts.array)
+
+    @classmethod
+    def from_activities(cls, activities: Iterable[IatiActivity]) -> TransactionTable:
+        rows: Dict[str, List[Any]] = {
+            name: []
+            for name in (
+                "iati_identifier",
+                "reporting_org",
+                "transaction_type",
+                "currency",
+                "recipient_country",
+                "recipient_region",
+                "flow_type",
+                "finance_type",
+                "aid_type",
+                "transaction_date",
+                "value_date",
+            )
+        }
+        amounts: List[Decimal] = []
+        # Each transaction's share of each sector: (transaction row, vocabulary, code, percentage)
+        sectors: List[Tuple[int, str, str, Decimal]] = []
+
+        for activity in activities:
+            for transaction in activity.transaction:
+                row = len(amounts)
+                rows["iati_identifier"].append(activity.iati_identifier)
+                rows["reporting_org"].append(activity.reporting_org.ref if activity.reporting_org else None)
+                rows["transaction_type"].append(transaction.transaction_type.code if transaction.transaction_type else None)
+                rows["currency"].append(transaction.value.currency or activity.default_currency)
+                rows["recipient_country"].append(transaction.recipient_country.code if transaction.recipient_country else None)
+                rows["recipient_region"].append(transaction.recipient_region.code if transaction.recipient_region else None)
+                rows["flow_type"].append(transaction.flow_type.code if transaction.flow_type else None)
+                rows["finance_type"].append(transaction.finance_type.code if transaction.finance_type else None)
+                rows["aid_type"].append(transaction.aid_type[0].code if transaction.aid_type else None)
+                rows["transaction_date"].append(transaction.transaction_date.iso_date if transaction.transaction_date else None)
+                rows["value_date"].append(transaction.value.value_date)
+                amounts.append(Decimal(transaction.value.amount))
+                sectors.extend((row, *share) for share in sector_shares(activity, transaction))
+
+        dates = {name: np.array(rows.pop(name), dtype="datetime64[D]") for name in ("transaction_date", "value_date")}
+        columns = {name: CodeColumn(values) for name, values in rows.items()}
+        columns["year"] = CodeColumn(_years(dates["transaction_date"]))
+        columns["value_year"] = CodeColumn(_years(dates["value_date"]))
+        return cls(
+            columns,
+            dates,
+            Amounts.pack(amounts),
+            {
+                "row": np.array([share[0] for share in sectors], dtype=np.int64),
+                "vocabulary": CodeColumn(share[1] for share in sectors),
+                "code": CodeColumn(share[2] for share in sectors),
+                "percentage": Amounts.pack([share[3] for share in sectors]),
+            },
+        )
+
+    def sum(self, by: Sequence[str] = ("currency",)) -> Dict[Tuple, Decimal]:
+        """
+        Total amount for each combination of the `by` columns
+        """
+        return group_sum([self.columns[name] for name in by], self.amounts)
+
+    def sum_by_year(self, by: Sequence[str] = ("currency",)) -> Dict[Tuple, Decimal]:
+        """
+        Total amount per year of the transaction date, as the first key, and the `by` columns
+        """
+        return self.sum(["year", *by])
+
+    def sum_by_sector(self, by: Sequence[str] = ("currency",), vocabulary: str = "1") -> Dict[Tuple, Decimal]:
+        """
+        Total amount per sector code of a vocabulary, as the first key, and the `by` columns.
+        Transactions are split between sectors as described in `sector_shares`
+        """
+        sectors = self._sectors
+        if vocabulary not in sectors["vocabulary"].values:
+            return {}
+        selected = np.flatnonzero(sectors["vocabulary"].indexes == sectors["vocabulary"].values.index(vocabulary))
+        rows = sectors["row"][selected]
+        percentages = Amounts(sectors["percentage"].array[selected], sectors["percentage"].scale)
+        keys = [sectors["code"].subset(selected)] + [self.columns[name].subset(rows) for name in by]
+        return group_sum(keys, self.amounts.times(rows, percentages))
+
+
+def sector_shares(activity: IatiActivity, transaction: Transaction) -> Iterator[Tuple[str, str, Decimal]]:
+    """
+    The (vocabulary, code, percentage) shares of a transaction's value for each sector:
+    a transaction's own sectors take all of its value, otherwise it is split
+    by the percentages of the activity's sectors in that vocabulary.
+    A missing percentage is taken as 100%, as for an activity with a single sector
+    """
+    own = {own_sector.vocabulary for own_sector in transaction.sector}
+    for own_sector in transaction.sector:
+        yield own_sector.vocabulary, own_sector.code, Decimal(100)
+    for sector in activity.sector:
+        if sector.vocabulary not in own:
+            yield sector.vocabulary, sector.code, Decimal(100) if sector.percentage is None else sector.percentage
+
+
+def _years(dates: np.ndarray) -> Iterator[Optional[int]]:
+    years = dates.astype("datetime64[Y]").astype(np.int64) + 1970
+    return (None if np.isnat(date) else int(year) for date, year in zip(dates, years))
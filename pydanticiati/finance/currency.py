@@ -0,0 +1,124 @@
+"""
+Convert amounts between currencies with a local table of exchange rates.
+
+Rates are read from a CSV file or SQLite table with `currency`, `date` and `rate` columns,
+where `rate` is the value of one unit of `currency` in the base currency on that date:
+
+    currency,date,rate
+    EUR,2021-01-04,1.2296
+    GBP,2021-01-04,1.3627
+
+The rate used for an amount is the latest one on or before its date,
+found by binary search over each currency's sorted dates:
+
+>>> rates = ExchangeRates.from_csv("rates.csv", base="USD")
+>>> rates.rate("EUR", date(2021, 1, 5))
+1.2296
+>>> table = TransactionTable.from_activities(activities)
+>>> usd = rates.convert_table(table)  # a float64 array, one amount per transaction
+"""
+from __future__ import annotations
+
+import csv
+import os
+import sqlite3
+from contextlib import closing
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from activity.models import IatiActivity
+from finance.aggregate import CodeColumn, TransactionTable
+
+
+class ExchangeRates:
+    """
+    Exchange rates to a `base` currency, held as sorted date and rate arrays per currency.
+    Amounts which can't be converted (an unknown currency, or a date before a currency's
+    first rate) convert to NaN
+    """
+
+    def __init__(self, rates: Iterable[Tuple[str, Union[str, date], Union[str, float, Decimal]]], base: str = "USD"):
+        self.base = base
+        grouped: Dict[str, List[Tuple[Union[str, date], float]]] = {}
+        for currency, on, rate in rates:
+            grouped.setdefault(currency, []).append((on, float(rate)))
+
+        self._dates: Dict[str, np.ndarray] = {}
+        self._rates: Dict[str, np.ndarray] = {}
+        for currency, items in grouped.items():
+            dates = np.array([on for on, _ in items], dtype="datetime64[D]")
+            order = np.argsort(dates, kind="stable")
+            self._dates[currency] = dates[order]
+            self._rates[currency] = np.array([rate for _, rate in items], dtype=np.float64)[order]
+
+    @classmethod
+    def from_csv(cls, path: Union[str, os.PathLike], base: str = "USD") -> ExchangeRates:
+        with open(path, newline="") as source:
+            return cls([(row["currency"], row["date"], row["rate"]) for row in csv.DictReader(source)], base=base)
+
+    @classmethod
+    def from_sqlite(cls, path: Union[str, os.PathLike], table: str = "exchange_rate", base: str = "USD") -> ExchangeRates:
+        with closing(sqlite3.connect(path)) as connection:
+            return cls(connection.execute(f"SELECT currency, date, rate FROM {table}").fetchall(), base=base)
+
+    @property
+    def currencies(self) -> List[str]:
+        return sorted(self._dates)
+
+    def rate(self, currency: str, on: date) -> Optional[float]:
+        """
+        The rate for one currency on a date
+        """
+        rates = self.rates([currency], np.array([on], dtype="datetime64[D]"))
+        return None if np.isnan(rates[0]) else float(rates[0])
+
+    def rates(self, currencies: Union[Sequence[Optional[str]], CodeColumn], dates: np.ndarray) -> np.ndarray:
+        """
+        The rate for each (currency, date) pair, looked up a currency at a time
+        """
+        if not isinstance(currencies, CodeColumn):
+            currencies = CodeColumn(currencies)
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        rates = np.full(len(currencies), np.nan)
+        for index, currency in enumerate(currencies.values):
+            rows = np.flatnonzero(currencies.indexes == index)
+            if currency == self.base:
+                rates[rows] = 1.0
+            elif currency in self._dates:
+                # The latest rate on or before each date; -1 where there is none
+                found = np.searchsorted(self._dates[currency], dates[rows], side="right") - 1
+                valid = (found >= 0) & ~np.isnat(dates[rows])
+                rates[rows[valid]] = self._rates[currency][found[valid]]
+        return rates
+
+    def convert(self, amounts: Union[Sequence[Union[Decimal, float]], np.ndarray], currencies: Union[Sequence[Optional[str]], CodeColumn], dates: np.ndarray) -> np.ndarray:
+        """
+        Convert amounts to the base currency, in bulk
+        """
+        return np.asarray(amounts, dtype=np.float64) * self.rates(currencies, dates)
+
+    def convert_table(self, table: TransactionTable, date_column: str = "value_date") -> np.ndarray:
+        """
+        Convert the amounts of a `TransactionTable`, at the rates on their `value_date`
+        (or `transaction_date`). Its currencies already fall back to the activity's `default_currency`
+        """
+        return self.convert(table.amounts.decimals().astype(np.float64), table.columns["currency"], table.dates[date_column])
+
+    def convert_values(self, activities: Iterable[IatiActivity], items: str = "budget") -> np.ndarray:
+        """
+        Convert the `value` of each of the activities' `items`
+        (such as "budget", "planned_disbursement" or "transaction"),
+        at the rate on the value date.
+        A value with no currency is in its activity's `default_currency`
+        """
+        amounts: List[Decimal] = []
+        currencies: List[Optional[str]] = []
+        dates: List[date] = []
+        for activity in activities:
+            for item in getattr(activity, items):
+                amounts.append(Decimal(item.value.amount))
+                currencies.append(item.value.currency or activity.default_currency)
+                dates.append(item.value.value_date)
+        return self.convert(amounts, currencies, np.array(dates, dtype="datetime64[D]"))
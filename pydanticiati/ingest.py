@@ -0,0 +1,121 @@
+"""
+Parse and validate many activity files in parallel, over a process pool
+
+>>> for result in ingest_directory("registry/data", workers=8):
+...     if result.error:
+...         logger.warning(f"{result.path}: {result.error}")
+"""
+from __future__ import annotations
+
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, Optional, Type, Union
+
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from activity.models import IatiActivities
+
+logger = logging.getLogger(__name__)
+
+# The model class used in worker processes, imported once per worker by `_init_worker`
+_model: Optional[Type[IatiActivities]] = None
+
+Sink = Callable[[Path, BaseModel], None]
+
+
+class IngestResult(BaseModel):
+    """
+    The outcome of ingesting one file.
+    `activities` is not sent back when a sink consumed them in the worker
+    """
+
+    path: Path
+    activities: Optional[Any]  # IatiActivities
+    activity_count: Optional[int]
+    error: Optional[str]
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _init_worker() -> Type[IatiActivities]:
+    """
+    Import the models once in each worker process,
+    rather than paying that cost for every file
+    """
+    global _model
+    from activity.models import IatiActivities
+
+    _model = IatiActivities
+    return _model
+
+
+def _ingest_file(path: Path, sink: Optional[Sink] = None) -> IngestResult:
+    model = _model or _init_worker()
+    try:
+        activities = model.from_file(path)
+        if sink:
+            sink(path, activities)
+    except Exception as E:
+        return IngestResult(path=path, error=f"{E.__class__.__name__}: {E}")
+    return IngestResult(path=path, activities=None if sink else activities, activity_count=len(activities.iati_activity))
+
+
+def _find_files(paths: Union[str, os.PathLike, Iterable[Union[str, os.PathLike]]]) -> Iterator[Path]:
+    if isinstance(paths, (str, os.PathLike)):
+        if Path(paths).is_dir():
+            yield from sorted(Path(paths).glob("*.xml"))
+            return
+        paths = [paths]
+    for path in paths:
+        yield Path(path)
+
+
+def ingest_directory(
+    paths: Union[str, os.PathLike, Iterable[Union[str, os.PathLike]]],
+    workers: Optional[int] = None,
+    sink: Optional[Sink] = None,
+    max_pending: Optional[int] = None,
+) -> Iterator[IngestResult]:
+    """
+    Parse and validate activity files over a pool of `workers` processes,
+    yielding an `IngestResult` for each file as it completes.
+
+    `paths` is a directory of ".xml" files, or an iterable of file paths.
+    A file which fails is reported with its `error` and does not stop the batch.
+
+    If `sink` is given it is called in the worker process with each file's path and parsed
+    `IatiActivities`, and only a summary is returned, saving the cost of
+    sending the models back to this process. It must be picklable (a module level function).
+
+    At most `max_pending` files (by default, twice the number of workers) are submitted
+    at a time, and each result is released once it has been yielded,
+    so memory use doesn't grow with the size of the batch.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    files = _find_files(paths)
+    futures: Dict[Future, Path] = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        while True:
+            for path in files:
+                futures[executor.submit(_ingest_file, path, sink)] = path
+                if len(futures) >= max_pending:
+                    break
+            if not futures:
+                return
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            while done:
+                future = done.pop()
+                path = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as E:
+                    # The worker itself failed, for instance it was killed
+                    logger.error(f"Worker failed on {path}: {E}")
+                    result = IngestResult(path=path, error=f"{E.__class__.__name__}: {E}")
+                yield result
@@ -1,9 +1,9 @@
 from typing import List, Optional
 
-from base_models import Narrative, XmlBaseModel
+from base_models import FlyweightModel, Narrative
 
 
-class ReportingOrg(XmlBaseModel):
+class ReportingOrg(FlyweightModel):
     type: int
     ref: str
     narrative: List[Narrative]
@@ -0,0 +1,213 @@
+"""
+Crawl the datastore's dataset listing and download the datasets
+
+>>> async with DatasetCrawler(concurrency=20) as crawler:
+...     async for download in crawler.crawl(parse=IatiActivities.from_bytes):
+...         download.parsed
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, Optional, Set, Union
+
+import httpx
+from base_models import Dataset, DatasetResult
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+DATASETS_URL = "https://iatidatastore.iatistandard.org/api/datasets/?format=json"
+
+# Responses worth retrying: the server is overloaded or rate limiting
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class Download(BaseModel):
+    """
+    The outcome of downloading (and optionally parsing) a dataset's `source_url`
+    """
+
+    dataset: DatasetResult
+    status_code: Optional[int]
+    content: Optional[bytes]
+    parsed: Optional[Any]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    error: Optional[str]
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class DatasetCrawler:
+    """
+    Walk the paginated `/api/datasets/` listing, then download each dataset's
+    `source_url` concurrently over one pooled `httpx.AsyncClient`.
+
+    At most `concurrency` requests are in flight, and at most `per_host` to any one host.
+    Failed requests (connection errors and 429/5xx responses) are retried
+    `retries` times, waiting `backoff * 2 ** attempt` seconds between attempts.
+    """
+
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        concurrency: int = 10,
+        per_host: int = 4,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: httpx.Timeout = httpx.Timeout(30.0, connect=60.0),
+    ):
+        self._own_client = client is None
+        self.client = client or httpx.AsyncClient(
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        # Created on first use, inside the running event loop
+        self._requests: Optional[asyncio.Semaphore] = None
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+
+    async def __aenter__(self) -> DatasetCrawler:
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._own_client:
+            await self.client.aclose()
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """
+        GET a URL within the concurrency limits, retrying with backoff.
+        Raises `httpx.HTTPError` once the retries are used up
+        """
+        if self._requests is None:
+            self._requests = asyncio.Semaphore(self.concurrency)
+        host = httpx.URL(url).host
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+
+        attempt = 0
+        while True:
+            try:
+                # Wait for the host first, so a busy host does not hold up requests to others
+                async with self._hosts[host], self._requests:
+                    response = await self.client.get(url, headers=headers or {})
+                if response.status_code == httpx.codes.NOT_MODIFIED:
+                    # The answer to a conditional request
+                    return response
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.retries:
+                    response.raise_for_status()
+                    return response
+                logger.warning(f"Retrying {url} after {response.status_code} response")
+            except httpx.TransportError as E:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Retrying {url} after {E!r}")
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+    async def pages(self, url: str = DATASETS_URL) -> AsyncIterator[Dataset]:
+        """
+        Follow the `next` links of the dataset listing
+        """
+        next_url: Optional[str] = url
+        while next_url:
+            page = Dataset.parse_raw((await self.get(next_url)).content)
+            yield page
+            next_url = page.next
+
+    async def datasets(self, url: str = DATASETS_URL) -> AsyncIterator[DatasetResult]:
+        async for page in self.pages(url):
+            for result in page.results:
+                yield result
+
+    async def download(
+        self,
+        dataset: DatasetResult,
+        parse: Optional[Callable[[bytes], Any]] = None,
+        executor: Optional[Executor] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Download:
+        """
+        Download one dataset, never raising: failures are returned as the `error`.
+        `parse` is run on the content in `executor` (the default thread pool if not given)
+        so that parsing does not hold up the other downloads
+        """
+        try:
+            response = await self.get(dataset.source_url, headers=headers)
+        except httpx.HTTPStatusError as E:
+            return Download(dataset=dataset, status_code=E.response.status_code, error=f"{E.__class__.__name__}: {E}")
+        except httpx.HTTPError as E:
+            return Download(dataset=dataset, error=f"{E.__class__.__name__}: {E}")
+
+        download = Download(
+            dataset=dataset,
+            status_code=response.status_code,
+            content=response.content,
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+        )
+        if parse and response.status_code == httpx.codes.OK:
+            try:
+                download.parsed = await asyncio.get_running_loop().run_in_executor(executor, parse, response.content)
+            except Exception as E:
+                download.error = f"{E.__class__.__name__}: {E}"
+        return download
+
+    async def crawl(
+        self,
+        datasets: Optional[Union[Iterable[DatasetResult], AsyncIterable[DatasetResult]]] = None,
+        parse: Optional[Callable[[bytes], Any]] = None,
+        executor: Optional[Executor] = None,
+        headers: Optional[Callable[[DatasetResult], Dict[str, str]]] = None,
+    ) -> AsyncIterator[Download]:
+        """
+        Download `datasets` (by default, every dataset in the listing) concurrently,
+        yielding each `Download` as it completes.
+        `headers` gives any extra request headers for a dataset
+        """
+        if datasets is None:
+            datasets = self.datasets()
+
+        pending: Set[asyncio.Task] = set()
+
+        async def drain(until: int) -> AsyncIterator[Download]:
+            nonlocal pending
+            while len(pending) > until:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+
+        try:
+            async for dataset in _aiter(datasets):
+                # Don't queue up more downloads than can run at once
+                async for download in drain(self.concurrency - 1):
+                    yield download
+                pending.add(asyncio.ensure_future(self.download(dataset, parse=parse, executor=executor, headers=headers(dataset) if headers else None)))
+
+            async for download in drain(0):
+                yield download
+        finally:
+            # The consumer stopped early (or something failed): don't leave downloads running on the client
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def _aiter(items: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
@@ -1,7 +1,7 @@
 from typing import Any, List, Optional
 
 import httpx
-from base_models import IntField, TextField, XmlBaseModel
+from base_models import AsyncElementStream, IntField, TextField, XmlBaseModel
 from pydantic import BaseModel
 from pydantic.networks import HttpUrl
 
@@ -28,6 +28,13 @@ class IatiPublishersList(XmlBaseModel):
         result = await super().from_url(url, client=client)
         return result
 
+    @classmethod
+    def stream_url(cls, url: str = "https://www.iatiregistry.org/publisher/download/xml", client: Optional[httpx.AsyncClient] = None, **options) -> AsyncElementStream:
+        """
+        Download the publishers list, parsing each `Publisher` as it arrives
+        """
+        return AsyncElementStream(url, item_class=Publisher, tag="iati-identifier", client=client, **options)
+
 
 class KeyValuePair(BaseModel):
     key: str
@@ -0,0 +1,165 @@
+"""
+Incremental sync of registry datasets: only new or changed datasets are downloaded and parsed
+
+>>> state = SyncState.load("sync.json")
+>>> async with DatasetCrawler() as crawler:
+...     sync = DatasetSync(crawler, state)
+...     plan = await sync.plan()
+...     async for download in sync.run(plan, parse=IatiActivities.from_bytes, output=save):
+...         ...
+>>> state.save("sync.json")
+>>> plan.removed
+"""
+from __future__ import annotations
+
+import logging
+import os
+from concurrent.futures import Executor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Union
+
+import httpx
+from base_models import DatasetResult
+from pydantic import BaseModel
+from registry.crawler import DatasetCrawler, Download
+
+logger = logging.getLogger(__name__)
+
+
+class SyncRecord(BaseModel):
+    """
+    What was last seen of a dataset, and where its parsed output went
+    """
+
+    name: str
+    sha1: str
+    date_updated: Optional[datetime]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    output: Optional[str]
+
+
+class SyncPlan(BaseModel):
+    """
+    The datasets in the registry, compared with the last sync
+    """
+
+    new: List[DatasetResult] = []
+    changed: List[DatasetResult] = []
+    unchanged: List[DatasetResult] = []
+    removed: List[SyncRecord] = []
+
+    @property
+    def fetch(self) -> List[DatasetResult]:
+        return self.new + self.changed
+
+
+class SyncState(BaseModel):
+    """
+    On-disk sync state, keyed by dataset `name`
+    """
+
+    records: Dict[str, SyncRecord] = {}
+
+    @classmethod
+    def load(cls, path: Union[str, os.PathLike]) -> SyncState:
+        path = Path(path)
+        if not path.exists():
+            return cls()
+        return cls.parse_file(path)
+
+    def save(self, path: Union[str, os.PathLike]):
+        # Write then rename, so an interrupted run leaves the previous state intact
+        temp = Path(f"{path}.tmp")
+        temp.write_text(self.json(indent=1))
+        temp.replace(path)
+
+    def plan(self, datasets: Iterable[DatasetResult]) -> SyncPlan:
+        plan = SyncPlan()
+        seen = set()
+        for dataset in datasets:
+            seen.add(dataset.name)
+            record = self.records.get(dataset.name)
+            if record is None:
+                plan.new.append(dataset)
+            elif record.sha1 != dataset.sha1:
+                plan.changed.append(dataset)
+            else:
+                plan.unchanged.append(dataset)
+        plan.removed = [record for name, record in self.records.items() if name not in seen]
+        return plan
+
+    def conditional_headers(self, dataset: DatasetResult) -> Dict[str, str]:
+        """
+        Headers to skip the download if the server has nothing newer
+        """
+        headers = {}
+        record = self.records.get(dataset.name)
+        if record and record.etag:
+            headers["If-None-Match"] = record.etag
+        if record and record.last_modified:
+            headers["If-Modified-Since"] = record.last_modified
+        return headers
+
+    def record(self, download: Download, output: Optional[str] = None):
+        dataset = download.dataset
+        previous = self.records.get(dataset.name)
+        if download.status_code == httpx.codes.NOT_MODIFIED and previous:
+            # Same content as last time: keep the validators and output we already have
+            self.records[dataset.name] = previous.copy(update={"sha1": dataset.sha1, "date_updated": dataset.date_updated})
+            return
+        self.records[dataset.name] = SyncRecord(
+            name=dataset.name,
+            sha1=dataset.sha1,
+            date_updated=dataset.date_updated,
+            etag=download.etag,
+            last_modified=download.last_modified,
+            output=output,
+        )
+
+    def forget(self, removed: Iterable[SyncRecord]):
+        for record in removed:
+            self.records.pop(record.name, None)
+
+
+class DatasetSync:
+    """
+    Download and parse only the datasets which are new or have a different `sha1`
+    since the last run, so that a run costs time in proportion to what changed
+    """
+
+    def __init__(self, crawler: DatasetCrawler, state: SyncState):
+        self.crawler = crawler
+        self.state = state
+
+    async def plan(self, datasets: Optional[Iterable[DatasetResult]] = None) -> SyncPlan:
+        """
+        Compare `datasets` (by default, the whole listing) with the sync state
+        """
+        if datasets is None:
+            datasets = [dataset async for dataset in self.crawler.datasets()]
+        return self.state.plan(datasets)
+
+    async def run(
+        self,
+        plan: SyncPlan,
+        parse: Optional[Callable[[bytes], Any]] = None,
+        executor: Optional[Executor] = None,
+        output: Optional[Callable[[Download], Optional[str]]] = None,
+    ) -> AsyncIterator[Download]:
+        """
+        Fetch the new and changed datasets in `plan`, yielding each download.
+        Successful downloads are recorded in the state, along with the pointer
+        returned by `output` (for instance, the path the parsed data was written to).
+        Failed downloads are not recorded, so they are retried next time.
+        Datasets removed from the registry are dropped from the state at the end.
+        """
+        async for download in self.crawler.crawl(plan.fetch, parse=parse, executor=executor, headers=self.state.conditional_headers):
+            if download.ok:
+                pointer = output(download) if output and download.status_code != httpx.codes.NOT_MODIFIED else None
+                self.state.record(download, pointer)
+            else:
+                logger.warning(f"{download.dataset.name}: {download.error}")
+            yield download
+        self.state.forget(plan.removed)
@@ -1,11 +1,17 @@
+import asyncio
+import io
 import logging
+import pickle
 import xml.etree.ElementTree as ET
 from pathlib import Path
 from xml.dom import minidom
 
+import httpx
 import pytest
-from activity.models import IatiActivities, Title
-from base_models import Narrative
+import xml_backend
+from activity.models import IatiActivities, IatiActivitiesHeader, IatiActivity, Title
+from base_models import Deferred, Interner, Narrative, ParseErrors, UnmappedContent, XmlToModel
+from pydantic import ValidationError
 
 logger = logging.getLogger(__name__)
 
@@ -62,6 +68,14 @@ def activity_element_real_data():
     return ET.parse(path)
 
 
+def test_parse_plan_is_cached():
+    plan = XmlToModel.plan_for(Title)
+    assert XmlToModel.plan_for(Title) is plan
+    (narrative,) = plan.fields
+    assert narrative.getter is XmlToModel.get_narratives
+    assert narrative.tag == "narrative"
+
+
 def test_title(el_title):
     title = Title.from_element(el_title)
     assert len(title.narrative) == 2
@@ -92,6 +106,243 @@ def test_real_activity(activity_element_real_data):
     IatiActivities.from_element(activity_element_real_data.getroot())
 
 
+@pytest.mark.parametrize("fixture", ["activity_element", "activity_element_real_data"])
+def test_trusted_parse(fixture, request):
+    """
+    Trusted parsing builds the same models as full validation, without validating them
+    """
+    root = request.getfixturevalue(fixture).getroot()
+    validated = IatiActivities.from_element(root)
+    trusted = IatiActivities.from_element(root, trusted=True)
+    assert trusted == validated
+    assert trusted.json() == validated.json()
+    activity, validated_activity = trusted.iati_activity[0], validated.iati_activity[0]
+    assert type(activity.activity_status.code) is type(validated_activity.activity_status.code)
+    assert activity.__fields_set__ == validated_activity.__fields_set__
+
+
+def test_lazy_parse(activity_element):
+    """
+    Lazily parsed nested models are only built on first access, and then kept
+    """
+    validated = IatiActivities.from_element(activity_element.getroot())
+    lazy = IatiActivities.from_element(activity_element.getroot(), lazy=True)
+    assert isinstance(lazy.__dict__["iati_activity"], Deferred)
+
+    activity = lazy.iati_activity[0]
+    assert lazy.iati_activity[0] is activity
+    assert isinstance(activity, IatiActivity)
+    assert type(activity).__name__ == "IatiActivity"
+    assert activity.iati_identifier == validated.iati_activity[0].iati_identifier
+    assert isinstance(activity.__dict__["result"], Deferred)
+    assert activity.transaction == validated.iati_activity[0].transaction
+    assert isinstance(activity.__dict__["result"], Deferred)
+
+    # Reading the whole model parses everything
+    assert lazy == validated
+    assert lazy.json() == validated.json()
+    assert ET.tostring(lazy.to_element()) == ET.tostring(validated.to_element())
+
+
+def test_projection(activity_element_real_data):
+    fields = ["iati_identifier", "transaction.value", "transaction.transaction_date"]
+    full = IatiActivities.from_element(activity_element_real_data.getroot())
+    activities = IatiActivities.from_element(activity_element_real_data.getroot(), fields=["iati_activity." + f for f in fields])
+    streamed = list(IatiActivities.iter_file(Path("pydanticiati") / "data" / "sample" / "111111_publisher-activities.xml", fields=fields))
+
+    for projected in activities.iati_activity, streamed:
+        for activity, expected in zip(projected, full.iati_activity):
+            assert activity.iati_identifier == expected.iati_identifier
+            assert activity.reporting_org is None
+            assert activity.__fields_set__ == {"iati_identifier", "transaction"}
+            assert activity.dict(exclude_unset=True) == expected.dict(include={"iati_identifier": ..., "transaction": {"__all__": {"value", "transaction_date"}}})
+
+
+@pytest.mark.parametrize("fields", [["title.nope"], ["iati_identifier.text"]])
+def test_projection_unknown_path(activity_element, fields):
+    with pytest.raises(ValueError):
+        IatiActivity.from_element(activity_element.getroot()[0], fields=fields)
+
+
+def test_compact(activity_element_real_data):
+    validated = IatiActivities.from_element(activity_element_real_data.getroot())
+    compact = IatiActivities.from_element(activity_element_real_data.getroot(), compact=True)
+    assert compact == validated
+
+    first, second = compact.iati_activity[:2]
+    assert first.transaction[0].transaction_type is first.transaction[2].transaction_type
+    assert first.transaction[0].transaction_type is not first.transaction[1].transaction_type
+    assert first.transaction[0].transaction_type.code != first.transaction[1].transaction_type.code
+    assert first.reporting_org.narrative[0] is second.reporting_org.narrative[0]
+    # Models holding lists are not shared, so the lists can't be changed for other activities
+    assert first.reporting_org is not second.reporting_org
+    first.reporting_org.narrative.clear()
+    assert second.reporting_org.narrative
+    # Shared instances can't be changed
+    with pytest.raises(TypeError):
+        first.transaction[0].transaction_type.code = "changed"
+    assert pickle.loads(pickle.dumps(compact.iati_activity[1])) == second
+    # Not shared, and still mutable, without `compact`
+    assert validated.iati_activity[0].reporting_org is not validated.iati_activity[1].reporting_org
+    validated.iati_activity[0].reporting_org.ref = "changed"
+    validated.iati_activity[0].transaction[0].transaction_type.code = "changed"
+
+
+def test_compact_stream():
+    path = Path("pydanticiati") / "data" / "sample" / "111111_publisher-activities.xml"
+    first, second = list(IatiActivities.iter_file(path, compact=True))[:2]
+    assert first.reporting_org.narrative[0] is second.reporting_org.narrative[0]
+    assert first.activity_status is second.activity_status
+
+
+def test_interner(activity_element_real_data):
+    interner = Interner()
+    interned = IatiActivities.from_element(activity_element_real_data.getroot(), interner=interner)
+    assert interned == IatiActivities.from_element(activity_element_real_data.getroot())
+
+    first, second = interned.iati_activity[:2]
+    assert first.title.narrative[0].lang is second.title.narrative[0].lang
+    assert first.transaction[0].provider_org.ref is first.transaction[1].provider_org.ref
+
+    stats = interner.stats()
+    assert stats["size"] == len(interner) < stats["misses"] + stats["hits"]
+    assert stats["saved_bytes"] > 0
+
+
+def test_interner_max_size():
+    interner = Interner(max_size=1)
+    assert interner("en") == "en"
+    assert interner("fr") == "fr"
+    assert len(interner) == 1
+    assert interner(None) is None
+    assert interner.stats()["misses"] == 2
+
+
+@pytest.fixture
+def extended_activities():
+    """
+    The sample activities, with extension attributes and elements which no model reads
+    """
+    path = Path("pydanticiati") / "data" / "sample" / "111111_publisher-activities.xml"
+    content = path.read_text()
+    content = content.replace("<iati-activities ", '<iati-activities xmlns:ext="http://example.org/ext" ')
+    content = content.replace("<iati-activity ", '<iati-activity ext:flag="1" ')
+    content = content.replace("</iati-activity>", "<ext:extra/><ext:extra/></iati-activity>")
+    content = content.replace("</reporting-org>", "<ext:note>dropped</ext:note></reporting-org>")
+    return content.encode()
+
+
+def test_unmapped_content(extended_activities):
+    unmapped = UnmappedContent()
+    IatiActivities.from_bytes(extended_activities, unmapped=unmapped)
+    assert unmapped.items() == [
+        ("IatiActivity", "element", "{http://example.org/ext}extra", 36),
+        ("IatiActivity", "attribute", "{http://example.org/ext}flag", 18),
+        ("ReportingOrg", "element", "{http://example.org/ext}note", 18),
+    ]
+
+
+def test_unmapped_content_warns_once(extended_activities):
+    with pytest.warns(UserWarning) as record:
+        IatiActivities.from_bytes(extended_activities)
+    assert len(record) == 1
+    assert "36 x element {http://example.org/ext}extra in IatiActivity" in str(record[0].message)
+
+    with pytest.warns(UserWarning) as record:
+        list(IatiActivities.iter_file(io.BytesIO(extended_activities)))
+    assert len(record) == 1
+
+
+def test_unmapped_content_not_verbose(extended_activities, recwarn):
+    IatiActivities.from_bytes(extended_activities, verbose=False)
+    list(IatiActivities.iter_file(io.BytesIO(extended_activities), verbose=False))
+    assert not recwarn
+
+
+@pytest.fixture
+def invalid_activities():
+    """
+    The sample activities, with an invalid date in the first and third
+    """
+    path = Path("pydanticiati") / "data" / "sample" / "111111_publisher-activities.xml"
+    content = path.read_text()
+    activities = content.split("<iati-activity ")
+    for n in (1, 3):
+        activities[n] = activities[n].replace('value-date="', 'value-date="soon', 1)
+    return "<iati-activity ".join(activities).encode()
+
+
+def test_invalid_activity_fails_parse(invalid_activities):
+    with pytest.raises(ValidationError):
+        IatiActivities.from_bytes(invalid_activities)
+
+
+def test_tolerant_parse(invalid_activities):
+    errors = ParseErrors()
+    activities = IatiActivities.from_bytes(invalid_activities, errors=errors)
+    assert len(activities.iati_activity) == 16
+
+    first, third = errors
+    assert first.model == "IatiActivity"
+    assert first.identifier == "BE-BCE_KBO-0421210424-KOEPELPROG2017-2021"
+    assert first.xpath == "/iati-activities/iati-activity[1]"
+    assert third.xpath == "/iati-activities/iati-activity[3]"
+    assert first.invalid_model == "Value"
+    assert first.errors[0]["loc"] == ("value_date",)
+    if xml_backend.name == xml_backend.LXML:
+        assert first.sourceline == 4
+    assert errors.counts() == {("Value", "value_date", "value_error.date"): 2}
+    assert errors.summary().startswith("2 invalid records skipped")
+
+    streamed = ParseErrors()
+    assert len(list(IatiActivities.iter_file(io.BytesIO(invalid_activities), errors=streamed))) == 16
+    assert [error.dict() for error in streamed] == [error.dict() for error in errors]
+
+
+def test_tolerant_parse_unconvertible_text():
+    """
+    Text which can't be converted to its field's type is recorded like any other invalid value
+    """
+    path = Path("pydanticiati") / "data" / "sample" / "111111_publisher-activities.xml"
+    content = path.read_text().replace('value-date="2017-12-31">192000<', 'value-date="2017-12-31">abc<', 1).encode()
+    with pytest.raises(ValidationError):
+        IatiActivities.from_bytes(content)
+
+    errors = ParseErrors()
+    activities = IatiActivities.from_bytes(content, errors=errors)
+    assert len(activities.iati_activity) == 17
+    assert errors.counts() == {("Value", "amount", "type_error.decimal"): 1}
+
+    streamed = ParseErrors()
+    assert len(list(IatiActivities.iter_file(io.BytesIO(content), errors=streamed))) == 17
+    assert len(streamed.errors) == 1
+
+
+def test_tolerant_trusted_parse(invalid_activities):
+    errors = ParseErrors()
+    activities = IatiActivities.from_bytes(invalid_activities, errors=errors, trusted=True)
+    assert len(activities.iati_activity) == 16
+    assert [error.errors[0]["loc"] for error in errors] == [("value_date",), ("value_date",)]
+
+
+@pytest.mark.asyncio
+async def test_stream_url():
+    path = Path("pydanticiati") / "data" / "sample" / "111111_publisher-activities.xml"
+    content = path.read_bytes()
+
+    async def chunks():
+        for start in range(0, len(content), 1000):
+            await asyncio.sleep(0)
+            yield content[start : start + 1000]
+
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=chunks()))
+    async with httpx.AsyncClient(transport=transport) as client:
+        stream = IatiActivities.stream_url("https://example.org/activities.xml", client=client)
+        activities = [activity async for activity in stream]
+    assert stream.header.version == "2.02"
+    assert activities == IatiActivities.from_file(path).iati_activity
+
+
 def test_activity_to_element(activity_element):
     a = IatiActivities.from_element(activity_element.getroot())
     el = a.to_element()
@@ -120,3 +371,59 @@ def test_canonical_comparison(activity_element):
 
     with open(canon_input, "w") as output_data:
         output_data.write(prettify(ET.parse(input_path).getroot()))
+
+
+def test_iter_file(activity_element_real_data):
+    """
+    Streaming a file gives the same activities as parsing it whole
+    """
+    path = Path("pydanticiati") / "data" / "sample" / "111111_publisher-activities.xml"
+    expected = IatiActivities.from_element(activity_element_real_data.getroot())
+
+    stream = IatiActivities.iter_file(path)
+    assert stream.header.version == "2.02"
+    assert stream.header.generated_datetime == expected.generated_datetime
+
+    activities = list(stream)
+    assert all(isinstance(a, IatiActivity) for a in activities)
+    assert activities == expected.iati_activity
+
+
+def test_write_file(activity_element):
+    """
+    Writing activities one at a time gives the same bytes as `to_element`
+    """
+    a = IatiActivities.from_element(activity_element.getroot())
+    header = IatiActivitiesHeader(**a.dict(exclude={"iati_activity"}))
+
+    output = io.BytesIO()
+    IatiActivities.write_file(output, iter(a.iati_activity), header)
+    assert output.getvalue() == xml_backend.tostring(a.to_element())
+
+
+@pytest.mark.parametrize("backend_name", [xml_backend.ETREE, xml_backend.LXML])
+def test_write_file_encoding(tmp_path, backend_name):
+    """
+    The document has a single XML declaration, whichever the encoding
+    """
+    path = Path("pydanticiati") / "data" / "sample" / "activity-standard-example-annotated.xml"
+    out = tmp_path / "out.xml"
+    default = xml_backend.name
+    xml_backend.use(backend_name)
+    try:
+        stream = IatiActivities.iter_file(path)
+        IatiActivities.write_file(out, stream, stream.header, encoding="iso-8859-1")
+    finally:
+        xml_backend.use(default)
+
+    assert out.read_bytes().count(b"<?xml") == 1
+    assert IatiActivities.from_file(out) == IatiActivities.from_file(path)
+
+
+def test_stream_round_trip(tmp_path):
+    path = Path("pydanticiati") / "data" / "sample" / "activity-standard-example-annotated.xml"
+    out = tmp_path / "out.xml"
+    stream = IatiActivities.iter_file(path)
+    IatiActivities.write_file(out, stream, stream.header)
+
+    assert list(IatiActivities.iter_file(out)) == IatiActivities.from_element(ET.parse(path).getroot()).iati_activity
@@ -0,0 +1,83 @@
+from collections import defaultdict
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from activity.models import IatiActivities, Sector  # noqa: E402
+from finance.aggregate import Amounts, CodeColumn, TransactionTable, group_sum  # noqa: E402
+
+
+@pytest.fixture(params=["111111_publisher-activities.xml", "activity-standard-example-annotated.xml"])
+def activities(request):
+    return IatiActivities.from_file(Path("pydanticiati") / "data" / "sample" / request.param).iati_activity
+
+
+def naive_totals(activities, key):
+    totals = defaultdict(Decimal)
+    for activity in activities:
+        for transaction in activity.transaction:
+            totals[key(activity, transaction)] += Decimal(transaction.value.amount)
+    return dict(totals)
+
+
+def test_sum(activities):
+    table = TransactionTable.from_activities(activities)
+    assert table.sum(by=["transaction_type", "currency"]) == naive_totals(
+        activities, lambda a, t: (t.transaction_type.code, t.value.currency or a.default_currency)
+    )
+    assert table.sum(by=["recipient_country"]) == naive_totals(activities, lambda a, t: (t.recipient_country.code if t.recipient_country else None,))
+    assert table.sum_by_year() == naive_totals(activities, lambda a, t: (t.transaction_date.iso_date.year, t.value.currency or a.default_currency))
+
+
+def naive_sector_totals(activities, vocabulary):
+    """
+    A transaction's own sectors in the vocabulary take all of its value; if it has none,
+    its value is split by the percentages of its activity's sectors, a missing percentage counting as 100
+    """
+    totals = defaultdict(Decimal)
+    for activity in activities:
+        for transaction in activity.transaction:
+            amount = Decimal(transaction.value.amount)
+            currency = transaction.value.currency or activity.default_currency
+            own = [sector for sector in transaction.sector if sector.vocabulary == vocabulary]
+            for sector in own:
+                totals[(sector.code, currency)] += amount
+            if own:
+                continue
+            for sector in activity.sector:
+                if sector.vocabulary == vocabulary:
+                    percentage = Decimal(100) if sector.percentage is None else sector.percentage
+                    totals[(sector.code, currency)] += amount * percentage / 100
+    return dict(totals)
+
+
+@pytest.mark.parametrize("vocabulary", ["1", "2"])
+def test_sum_by_sector(activities, vocabulary):
+    assert TransactionTable.from_activities(activities).sum_by_sector(vocabulary=vocabulary) == naive_sector_totals(activities, vocabulary)
+
+
+def test_sum_by_sector_split():
+    """
+    An activity's value is split between its sectors by their percentages
+    """
+    activity = IatiActivities.from_file(Path("pydanticiati") / "data" / "sample" / "activity-standard-example-annotated.xml").iati_activity[0]
+    split = activity.copy(
+        update={
+            "sector": [Sector(code="111", vocabulary="1", percentage=Decimal("60")), Sector(code="112", vocabulary="1", percentage=Decimal("40"))],
+            "transaction": [transaction.copy(update={"sector": []}) for transaction in activity.transaction],
+        }
+    )
+    assert TransactionTable.from_activities([split]).sum_by_sector() == {("111", "EUR"): Decimal("600"), ("112", "EUR"): Decimal("400")}
+    assert naive_sector_totals([split], "1") == {("111", "EUR"): Decimal("600"), ("112", "EUR"): Decimal("400")}
+
+
+def test_amounts_too_large_for_int64():
+    amounts = [Decimal("9" * 20), Decimal("0.001"), Decimal("1")]
+    packed = Amounts.pack(amounts)
+    assert packed.scale is None
+    key = CodeColumn(["a", "b", "a"])
+    assert group_sum([key], packed) == {("a",): Decimal("9" * 20) + 1, ("b",): Decimal("0.001")}
+    assert Amounts.pack(amounts[1:]).array.dtype == np.int64
@@ -4,14 +4,7 @@ from pytest_httpx import HTTPXMock
 
 from pydanticiati.registry.models import IatiPublishersList
 
-
-@pytest.mark.asyncio
-async def test_an_async_function(httpx_mock: HTTPXMock):
-
-    httpx_mock.add_response(
-        method="GET",
-        url="https://www.iatiregistry.org/publisher/download/xml",
-        content=b"""<?xml version="1.0" encoding="UTF-8" ?>
+PUBLISHERS = b"""<?xml version="1.0" encoding="UTF-8" ?>
 <iati-publishers-list>
 <iati-identifier id="AU-5">
    <publisher>Australia - Department of  Foreign Affairs and Trade</publisher>
@@ -27,7 +20,16 @@ async def test_an_async_function(httpx_mock: HTTPXMock):
     <datasets-count>145</datasets-count>
     <datasets-link>https://iatiregistry.org/publisher/worldbank</datasets-link>
     </iati-identifier>
-</iati-publishers-list>""",
+</iati-publishers-list>"""
+
+
+@pytest.mark.asyncio
+async def test_an_async_function(httpx_mock: HTTPXMock):
+
+    httpx_mock.add_response(
+        method="GET",
+        url="https://www.iatiregistry.org/publisher/download/xml",
+        content=PUBLISHERS,
         status_code=200,
         headers={"content-type": "text/xml"},
     )
@@ -35,3 +37,13 @@ async def test_an_async_function(httpx_mock: HTTPXMock):
     async with AsyncClient() as client:
         publishers = await IatiPublishersList.from_url(client=client)
     assert publishers
+
+
+@pytest.mark.asyncio
+async def test_stream_publishers(httpx_mock: HTTPXMock):
+    httpx_mock.add_response(url="https://www.iatiregistry.org/publisher/download/xml", content=PUBLISHERS, headers={"content-type": "text/xml"})
+
+    async with AsyncClient() as client:
+        publishers = [publisher async for publisher in IatiPublishersList.stream_url(client=client)]
+    assert [publisher.id for publisher in publishers] == ["AU-5", "44000"]
+    assert publishers[1].datasets_count == 145
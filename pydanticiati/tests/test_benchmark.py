@@ -0,0 +1,23 @@
+import json
+from pathlib import Path
+
+import benchmark
+
+
+def test_benchmark_smoke(tmp_path):
+    output = tmp_path / "results.json"
+    benchmark.main(["--scale", "3", "--repeat", "1", "--only", "parse", "json", "--output", str(output), "--workdir", str(tmp_path)])
+    results = json.loads(output.read_text())
+    assert results["environment"]["xml_backend"]
+    datasets = {result["dataset"]: result for result in results["results"]}
+    assert datasets["111111_publisher-activities"]["items"] == 18
+    assert datasets["111111_publisher-activities-x3"]["items"] == 3
+    assert datasets["CRSChannelCode-x3"]["items"] == 3
+    assert {result["operation"] for result in results["results"]} == {"parse", "json"}
+    assert all(result["items_per_second"] > 0 for result in results["results"])
+
+
+def test_scaled_identifiers_are_unique(tmp_path):
+    dataset = benchmark.scaled(benchmark.sample_datasets()[0], 40, Path(tmp_path))
+    activities = dataset.model.from_file(dataset.path)
+    assert len({activity.iati_identifier for activity in activities.iati_activity}) == 40
@@ -0,0 +1,81 @@
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+from activity.models import IatiActivities
+from base_models import Projection
+from cache import ParseCache
+from codelists.models import Codelist
+from pydantic import ValidationError
+
+
+@pytest.fixture
+def sample(tmp_path):
+    path = tmp_path / "activities.xml"
+    shutil.copy(Path("pydanticiati") / "data" / "sample" / "activity-standard-example-annotated.xml", path)
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ParseCache(tmp_path / "cache")
+
+
+def test_cache_hit(sample, cache):
+    parsed = IatiActivities.from_file(sample, cache=cache)
+    cached = IatiActivities.from_file(sample, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cached == parsed
+    assert cached is not parsed
+
+
+def test_cache_key(sample, cache):
+    IatiActivities.from_file(sample, cache=cache)
+    IatiActivities.from_file(sample, cache=cache, fields=["iati_activity.iati_identifier"])
+    IatiActivities.from_file(sample, cache=cache, lazy=True)
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    # Changed content is a different entry
+    sample.write_bytes(sample.read_bytes().replace(b"AA-AAA-123456789-ABC123", b"AA-AAA-123456789-ABC124"))
+    assert IatiActivities.from_file(sample, cache=cache).iati_activity[0].iati_identifier == "AA-AAA-123456789-ABC124"
+    assert cache.misses == 3
+
+
+def test_cache_trusted_key(sample, cache):
+    """
+    A trusted parse of invalid data is not returned for a validated parse
+    """
+    sample.write_bytes(sample.read_bytes().replace(b'<reporting-org ref="AA-AAA-123456789"', b"<reporting-org", 1))
+    assert IatiActivities.from_file(sample, cache=cache, trusted=True).iati_activity[0].reporting_org.ref is None
+    with pytest.raises(ValidationError):
+        IatiActivities.from_file(sample, cache=cache)
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_cache_compact_key(sample, cache):
+    """
+    Instances shared by a compact parse are not returned for other parses
+    """
+    compact = IatiActivities.from_file(sample, cache=cache, compact=True)
+    assert IatiActivities.from_file(sample, cache=cache) == compact
+    assert IatiActivities.from_file(sample, cache=cache, compact=True) == compact
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_cache_projection(sample, cache):
+    projection = Projection(IatiActivities, ["iati_activity.iati_identifier"])
+    parsed = IatiActivities.from_file(sample, cache=cache, fields=projection)
+    assert parsed.iati_activity[0].iati_identifier == "AA-AAA-123456789-ABC123"
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_cache_eviction(sample, cache):
+    codelist = Path("pydanticiati") / "data" / "sample" / "CRSChannelCode.xml"
+    IatiActivities.from_file(sample, cache=cache)
+    (first,) = cache.directory.iterdir()
+    os.utime(first, (0, 0))
+    cache.max_bytes = first.stat().st_size + 1
+    Codelist.from_file(codelist, cache=cache)
+    assert not first.exists()
+    assert len(list(cache.directory.iterdir())) <= 1
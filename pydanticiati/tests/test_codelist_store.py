@@ -0,0 +1,95 @@
+from pathlib import Path
+
+import pytest
+from activity.models import IatiActivities
+from codelists.models import Codelist
+from codelists.store import DEFAULT_PATH, CodelistIndex, CodelistStore, default_index, main
+from pydantic import ValidationError
+
+sample = Path("pydanticiati") / "data" / "sample"
+
+
+@pytest.fixture
+def store(tmp_path):
+    with CodelistStore(tmp_path / "codelists.db") as store:
+        store.build(sample)
+        yield store
+
+
+def test_build(store):
+    assert store.names() == ["ActivityScope", "CRSChannelCode"]
+
+
+def test_get(store):
+    item = store.get("ActivityScope", "1")
+    assert item.code == "1"
+    assert item.name.default.text == "Global"
+    assert store.get("ActivityScope", "1") is item
+    assert store.get("ActivityScope", "unknown") is None
+
+
+def test_items_match_xml(store):
+    codelist = Codelist.from_file(sample / "CRSChannelCode.xml")
+    assert list(store.items("CRSChannelCode")) == sorted(codelist.codelist_items.codelist_item, key=lambda item: item.code)
+    assert store.codes("CRSChannelCode") == {item.code for item in codelist.codelist_items.codelist_item}
+
+
+def test_name_by_language(store):
+    assert store.name("ActivityScope", "1") == "Global"
+    assert store.name("ActivityScope", "1", lang="fr") == "Mondial"
+
+
+def test_build_command(tmp_path):
+    main(["build", str(sample), "--db", str(tmp_path / "cli.db")])
+    with CodelistStore(tmp_path / "cli.db") as store:
+        assert store.codes("ActivityScope")
+
+
+@pytest.fixture
+def activity_codes():
+    return {
+        "Country": frozenset({"AF", "AG"}),
+        "GeographicLocationReach": frozenset({"1", "2"}),
+        "CollaborationType": frozenset({"1"}),
+        "DocumentCategory": frozenset({"A01"}),
+        "Language": frozenset({"en", "fr"}),
+    }
+
+
+def test_codelist_validation(activity_codes):
+    path = sample / "activity-standard-example-annotated.xml"
+    assert IatiActivities.from_file(path, codelists=CodelistIndex(activity_codes)) == IatiActivities.from_file(path)
+
+
+def test_codelist_validation_fails(activity_codes):
+    path = sample / "activity-standard-example-annotated.xml"
+    codes = CodelistIndex({**activity_codes, "Country": frozenset({"AF"})})
+    with pytest.raises(ValidationError, match="'AG' is not a code in the Country codelist"):
+        IatiActivities.from_file(path, codelists=codes)
+
+
+def test_index_from_store(store):
+    index = CodelistIndex.from_store(store)
+    assert index.codes("ActivityScope") == store.codes("ActivityScope")
+    with pytest.warns(UserWarning):
+        assert index.codes("Country") is None
+
+
+def test_unindexed_codelist_warns(activity_codes):
+    path = sample / "activity-standard-example-annotated.xml"
+    codes = {codelist: items for codelist, items in activity_codes.items() if codelist != "Country"}
+    with pytest.warns(UserWarning, match="The Country codelist is not indexed") as record:
+        IatiActivities.from_file(path, codelists=CodelistIndex(codes))
+    assert sum("Country" in str(warning.message) for warning in record) == 1
+
+
+def test_unbuilt_store(tmp_path):
+    empty = tmp_path / "codelists.db"
+    empty.write_bytes(DEFAULT_PATH.read_bytes())
+    with pytest.raises(ValueError, match="is not a codelist store"):
+        default_index(empty)
+    with pytest.raises(ValueError, match="is not a codelist store"):
+        CodelistStore(tmp_path / "missing.db").names()
+    # Lookups don't write to the database
+    assert empty.read_bytes() == DEFAULT_PATH.read_bytes()
+    assert not (tmp_path / "missing.db").exists()
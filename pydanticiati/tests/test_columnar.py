@@ -0,0 +1,69 @@
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from activity.models import IatiActivities
+from export.columnar import TABLES, ColumnarWriter, flatten
+
+
+@pytest.fixture
+def activities():
+    return IatiActivities.from_file(Path("pydanticiati") / "data" / "sample" / "activity-standard-example-annotated.xml").iati_activity
+
+
+def test_flatten(activities):
+    batches = {batch.table.name: batch.to_dict() for batch in flatten(activities)}
+    transactions = batches["transactions"]
+    assert transactions["iati_identifier"] == ["AA-AAA-123456789-ABC123"]
+    assert transactions["currency"] == ["EUR"]
+    assert transactions["amount"] == [Decimal("1000")]
+    assert len(batches["planned_disbursements"]["amount"]) == 2
+    assert batches["sectors"]["percentage"] == [sector.percentage for sector in activities[0].sector]
+
+
+def test_flatten_batches(activities):
+    batches = [batch for batch in flatten(activities * 5, tables=["sectors"], batch_size=4)]
+    assert [len(batch) for batch in batches] == [6, 6, 3]
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_columnar_writer(activities, tmp_path, format):
+    pa = pytest.importorskip("pyarrow")
+    with ColumnarWriter(tmp_path, format=format) as writer:
+        writer.write(activities)
+
+    if format == "parquet":
+        import pyarrow.parquet as pq
+
+        transactions = pq.read_table(tmp_path / "transactions.parquet")
+    else:
+        transactions = pa.ipc.open_file(tmp_path / "transactions.arrow").read_all()
+    assert transactions.schema.field("amount").type == pa.decimal128(38, 6)
+    assert transactions.schema.field("transaction_date").type == pa.date32()
+    assert pa.types.is_dictionary(transactions.schema.field("currency").type)
+    (row,) = transactions.to_pylist()
+    assert row["amount"] == Decimal("1000") and row["recipient_country"] == "TM"
+    assert {path.name for path in tmp_path.iterdir()} == {f"{table}.{format}" for table in TABLES}
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_columnar_writer_batches(tmp_path, format):
+    """
+    Batches with different codes are written to one file
+    """
+    pa = pytest.importorskip("pyarrow")
+    activities = IatiActivities.from_file(Path("pydanticiati") / "data" / "sample" / "111111_publisher-activities.xml").iati_activity
+    with ColumnarWriter(tmp_path, tables=["transactions"], format=format, batch_size=5) as writer:
+        writer.write(activities)
+
+    if format == "parquet":
+        import pyarrow.parquet as pq
+
+        transactions = pq.read_table(tmp_path / "transactions.parquet")
+    else:
+        transactions = pa.ipc.open_file(tmp_path / "transactions.arrow").read_all()
+    expected = [batch.to_dict() for batch in flatten(activities, tables=["transactions"], batch_size=5)]
+    assert len(expected) > 1
+    rows = transactions.to_pydict()
+    for name in ("iati_identifier", "transaction_type", "currency", "amount"):
+        assert rows[name] == [value for batch in expected for value in batch[name]]
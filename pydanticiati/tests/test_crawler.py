@@ -0,0 +1,95 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+from activity.models import IatiActivities
+from base_models import Dataset
+from httpx import AsyncClient
+from pytest_httpx import HTTPXMock
+from registry.crawler import DATASETS_URL, DatasetCrawler, Download
+
+sample = Path("pydanticiati") / "data" / "sample"
+PAGE_2 = "https://iatidatastore.iatistandard.org/api/datasets/?format=json&page=2"
+
+
+@pytest.fixture
+def listing(httpx_mock: HTTPXMock):
+    """
+    Two pages of the dataset listing
+    """
+    page = json.loads((sample / "datasets.json").read_text())
+    results = page["results"][:3]
+    for n, result in enumerate(results):
+        result["source_url"] = f"https://example.org/{n}.xml"
+
+    httpx_mock.add_response(url=DATASETS_URL, json={**page, "next": PAGE_2, "results": results[:2]})
+    httpx_mock.add_response(url=PAGE_2, json={**page, "next": None, "previous": DATASETS_URL, "results": results[2:]})
+    return httpx_mock
+
+
+@pytest.fixture
+def datastore(listing: HTTPXMock):
+    """
+    The listing, and the datasets' content
+    """
+    httpx_mock = listing
+
+    content = (sample / "111111_publisher-activities.xml").read_bytes()
+    httpx_mock.add_response(url="https://example.org/0.xml", content=content, headers={"etag": '"abc"'})
+    # Fails once, then succeeds
+    httpx_mock.add_response(url="https://example.org/1.xml", status_code=503)
+    httpx_mock.add_response(url="https://example.org/1.xml", content=content)
+    httpx_mock.add_response(url="https://example.org/2.xml", status_code=404)
+    return httpx_mock
+
+
+@pytest.mark.asyncio
+async def test_pages(listing):
+    async with DatasetCrawler(backoff=0) as crawler:
+        pages = [page async for page in crawler.pages()]
+    assert len(pages) == 2
+    assert [len(p.results) for p in pages] == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_crawl(datastore):
+    async with AsyncClient() as client:
+        crawler = DatasetCrawler(client=client, concurrency=2, backoff=0)
+        downloads = {d.dataset.source_url: d async for d in crawler.crawl(parse=IatiActivities.from_bytes)}
+
+    first = downloads["https://example.org/0.xml"]
+    assert first.ok
+    assert first.etag == '"abc"'
+    assert len(first.parsed.iati_activity) == 18
+
+    retried = downloads["https://example.org/1.xml"]
+    assert retried.ok
+    assert len(datastore.get_requests(url="https://example.org/1.xml")) == 2
+
+    missing = downloads["https://example.org/2.xml"]
+    assert not missing.ok
+    assert missing.status_code == 404
+    assert missing.parsed is None
+
+
+@pytest.mark.asyncio
+async def test_crawl_stopped_early():
+    """
+    Downloads still in flight are cancelled when the consumer stops
+    """
+    datasets = Dataset.parse_raw((sample / "datasets.json").read_bytes()).results[:3]
+
+    async def download(dataset, **kwargs):
+        if dataset is not datasets[0]:
+            await asyncio.sleep(3600)
+        return Download(dataset=dataset)
+
+    async with DatasetCrawler(concurrency=3) as crawler:
+        crawler.download = download
+        stream = crawler.crawl(datasets)
+        async for first in stream:
+            break
+        await stream.aclose()
+    assert first.dataset == datasets[0]
+    assert asyncio.all_tasks() == {asyncio.current_task()}
@@ -0,0 +1,64 @@
+import sqlite3
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from activity.models import IatiActivities  # noqa: E402
+from finance.aggregate import TransactionTable  # noqa: E402
+from finance.currency import ExchangeRates  # noqa: E402
+
+RATES = [("EUR", "2017-01-01", "1.05"), ("EUR", "2018-01-01", "1.2"), ("GBP", "2017-06-01", "1.25"), ("EUR", "2019-01-01", "1.15")]
+
+
+@pytest.fixture
+def rates():
+    return ExchangeRates(RATES, base="USD")
+
+
+@pytest.fixture
+def activities():
+    return IatiActivities.from_file(Path("pydanticiati") / "data" / "sample" / "111111_publisher-activities.xml").iati_activity
+
+
+def test_rate(rates):
+    assert rates.rate("EUR", date(2017, 1, 1)) == 1.05
+    assert rates.rate("EUR", date(2018, 12, 31)) == 1.2
+    assert rates.rate("EUR", date(2020, 1, 1)) == 1.15
+    assert rates.rate("EUR", date(2016, 12, 31)) is None
+    assert rates.rate("USD", date(2000, 1, 1)) == 1.0
+    assert rates.rate("XXX", date(2020, 1, 1)) is None
+
+
+def test_convert(rates):
+    dates = np.array(["2017-06-01", "2017-06-01", "2018-02-01", "2015-01-01"], dtype="datetime64[D]")
+    converted = rates.convert([Decimal("100"), Decimal("100"), Decimal("10"), Decimal("1")], ["GBP", "EUR", "EUR", "EUR"], dates)
+    assert converted[:3].tolist() == [125.0, 105.0, 12.0]
+    assert np.isnan(converted[3])
+
+
+def test_load(tmp_path, rates):
+    csv_path = tmp_path / "rates.csv"
+    csv_path.write_text("currency,date,rate\n" + "\n".join(",".join(row) for row in RATES))
+    database = tmp_path / "rates.db"
+    with sqlite3.connect(database) as connection:
+        connection.execute("CREATE TABLE exchange_rate (currency TEXT, date TEXT, rate REAL)")
+        connection.executemany("INSERT INTO exchange_rate VALUES (?, ?, ?)", RATES)
+
+    for loaded in ExchangeRates.from_csv(csv_path), ExchangeRates.from_sqlite(database):
+        assert loaded.currencies == ["EUR", "GBP"]
+        assert loaded.rate("EUR", date(2018, 6, 1)) == rates.rate("EUR", date(2018, 6, 1))
+
+
+def test_convert_table(rates, activities):
+    converted = rates.convert_table(TransactionTable.from_activities(activities))
+    expected = [
+        float(Decimal(transaction.value.amount)) * rates.rate(transaction.value.currency or activity.default_currency, transaction.value.value_date)
+        for activity in activities
+        for transaction in activity.transaction
+    ]
+    assert converted.tolist() == expected
+    assert rates.convert_values(activities, "budget").shape == (sum(len(activity.budget) for activity in activities),)
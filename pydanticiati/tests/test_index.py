@@ -0,0 +1,47 @@
+import shutil
+from pathlib import Path
+
+import pytest
+from activity.index import build_index, get_activity, index_path, load_index
+from activity.models import IatiActivities
+
+
+@pytest.fixture
+def sample(tmp_path):
+    path = tmp_path / "activities.xml"
+    shutil.copy(Path("pydanticiati") / "data" / "sample" / "111111_publisher-activities.xml", path)
+    return path
+
+
+def test_build_index(sample):
+    index = build_index(sample)
+    activities = IatiActivities.from_file(sample).iati_activity
+    assert [entry.identifier for entry in index.activities] == [activity.iati_identifier for activity in activities]
+    assert {entry.reporting_org for entry in index.activities} == {"BE-BCE_KBO-0421210424"}
+    assert index_path(sample).exists()
+    assert load_index(sample) == index
+
+
+def test_get_activity(sample):
+    activities = IatiActivities.from_file(sample).iati_activity
+    for activity in activities[0], activities[-1]:
+        assert get_activity(sample, activity.iati_identifier) == activity
+    assert get_activity(sample, activities[1].iati_identifier, reporting_org="XM-DAC-2-10") is None
+    assert get_activity(sample, "XM-nope") is None
+
+
+def test_index_is_rebuilt(sample):
+    build_index(sample)
+    identifier = "BE-BCE_KBO-0421210424-KOEPELPROG2017-2021"
+    sample.write_bytes(b"<!-- <iati-activity> -->\n" + sample.read_bytes().replace(identifier.encode(), b"XM-CHANGED"))
+    assert get_activity(sample, "XM-CHANGED").iati_identifier == "XM-CHANGED"
+    assert get_activity(sample, identifier) is None
+
+
+def test_get_activity_namespaces(tmp_path):
+    path = tmp_path / "namespaced.xml"
+    sample = (Path("pydanticiati") / "data" / "sample" / "activity-standard-example-annotated.xml").read_bytes()
+    sample = sample.replace(b"<iati-activities ", b'<iati-activities xmlns:x="http://example.org/x" ', 1)
+    path.write_bytes(sample.replace(b"</iati-activity>", b"<x:extension>1</x:extension></iati-activity>"))
+    assert build_index(path).namespaces == {"x": "http://example.org/x"}
+    assert get_activity(path, "AA-AAA-123456789-ABC123", verbose=False).iati_identifier == "AA-AAA-123456789-ABC123"
@@ -0,0 +1,48 @@
+import shutil
+from functools import partial
+from pathlib import Path
+
+import pytest
+from activity.models import IatiActivities
+from ingest import ingest_directory
+
+sample = Path("pydanticiati") / "data" / "sample" / "111111_publisher-activities.xml"
+
+
+@pytest.fixture
+def publisher_files(tmp_path):
+    for name in ("a.xml", "b.xml"):
+        shutil.copy(sample, tmp_path / name)
+    (tmp_path / "broken.xml").write_text("<iati-activities><iati-activity>")
+    return tmp_path
+
+
+def test_ingest_directory(publisher_files):
+    results = {r.path.name: r for r in ingest_directory(publisher_files, workers=2)}
+    assert set(results) == {"a.xml", "b.xml", "broken.xml"}
+
+    assert results["a.xml"].ok
+    assert results["a.xml"].activity_count == 18
+    assert results["a.xml"].activities == IatiActivities.from_file(sample)
+
+    assert not results["broken.xml"].ok
+    assert results["broken.xml"].error
+    assert results["broken.xml"].activities is None
+
+
+def write_identifiers(output: Path, path: Path, activities: IatiActivities):
+    (output / f"{path.stem}.txt").write_text("\n".join(a.iati_identifier for a in activities.iati_activity))
+
+
+def test_ingest_to_sink(publisher_files, tmp_path_factory):
+    output = tmp_path_factory.mktemp("output")
+    results = list(ingest_directory([publisher_files / "a.xml"], workers=1, sink=partial(write_identifiers, output)))
+
+    assert results[0].activities is None
+    assert results[0].activity_count == 18
+    assert len((output / "a.txt").read_text().splitlines()) == 18
+
+
+def test_ingest_bounded(publisher_files):
+    results = ingest_directory(publisher_files, workers=1, max_pending=1)
+    assert sorted(r.path.name for r in results) == ["a.xml", "b.xml", "broken.xml"]
@@ -0,0 +1,81 @@
+import json
+from pathlib import Path
+
+import pytest
+from activity.models import IatiActivities, IatiActivity
+from codelists.models import Codelist, CodelistItem
+from export import ndjson
+from registry.models import Publisher
+
+sample = Path("pydanticiati") / "data" / "sample"
+
+
+@pytest.fixture
+def activities():
+    return IatiActivities.from_file(sample / "111111_publisher-activities.xml")
+
+
+@pytest.mark.parametrize("path", ["activity-standard-example-annotated.xml", "111111_publisher-activities.xml"])
+def test_to_dict_matches_json(path):
+    activities = IatiActivities.from_file(sample / path)
+    assert ndjson.to_dict(activities) == json.loads(activities.json())
+
+
+def test_to_dict_encodes_like_json(activities):
+    # Not only equal values: decimals are encoded as integers or floats as pydantic does
+    assert json.dumps(ndjson.to_dict(activities)) == activities.json()
+
+
+def test_to_dict_codelist():
+    codelist = Codelist.from_file(sample / "CRSChannelCode.xml")
+    assert ndjson.to_dict(codelist) == json.loads(codelist.json())
+
+
+def test_to_dict_lazy(activities):
+    lazy = IatiActivities.from_file(sample / "111111_publisher-activities.xml", lazy=True)
+    assert ndjson.to_dict(lazy) == json.loads(activities.json())
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_ndjson_writer(activities, tmp_path, monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(ndjson, "orjson", None)
+    path = tmp_path / "activities.ndjson"
+    with ndjson.NdjsonWriter(path) as writer:
+        assert writer.write(activities.iati_activity) == 18
+    lines = path.read_bytes().splitlines()
+    assert len(lines) == 18
+    assert [json.loads(line) for line in lines] == [json.loads(activity.json()) for activity in activities.iati_activity]
+
+
+@pytest.mark.parametrize("trusted", [False, True])
+def test_from_dict(activities, trusted):
+    loaded = ndjson.from_dict(IatiActivities, ndjson.to_dict(activities), trusted=trusted)
+    assert loaded == activities
+    assert loaded.json() == activities.json()
+    assert ndjson.from_dict(IatiActivities, activities.dict(), trusted=trusted) == activities
+
+
+@pytest.mark.parametrize("trusted", [False, True])
+def test_from_dict_codelist(trusted):
+    codelist = Codelist.from_file(sample / "CRSChannelCode.xml")
+    assert ndjson.from_dict(Codelist, ndjson.to_dict(codelist), trusted=trusted) == codelist
+    item = codelist.codelist_items.codelist_item[0]
+    assert ndjson.from_dict(CodelistItem, item.dict(), trusted=trusted) == item
+
+
+def test_from_dict_publisher():
+    data = {"id": "AU-5", "publisher": "DFAT", "organization_type": "Government", "hq_country_or_region": "Australia", "datasets_count": "173", "datasets_link": "x"}
+    publisher = ndjson.from_dict(Publisher, data, trusted=True)
+    assert publisher.datasets_count == 173
+    assert publisher == ndjson.from_dict(Publisher, data)
+
+
+@pytest.mark.parametrize("trusted", [False, True])
+def test_ndjson_reader(activities, tmp_path, trusted):
+    path = tmp_path / "activities.ndjson"
+    with ndjson.NdjsonWriter(path) as writer:
+        writer.write(activities.iati_activity)
+    assert list(ndjson.NdjsonReader(path, IatiActivity, trusted=trusted)) == activities.iati_activity
@@ -0,0 +1,60 @@
+import json
+from pathlib import Path
+
+import pytest
+from base_models import DatasetResult
+from pytest_httpx import HTTPXMock
+from registry.crawler import DatasetCrawler
+from registry.sync import DatasetSync, SyncState
+
+sample = Path("pydanticiati") / "data" / "sample"
+
+
+@pytest.fixture
+def datasets():
+    results = json.loads((sample / "datasets.json").read_text())["results"][:3]
+    for n, result in enumerate(results):
+        result["source_url"] = f"https://example.org/{n}.xml"
+    return [DatasetResult(**result) for result in results]
+
+
+def test_plan(datasets):
+    state = SyncState()
+    plan = state.plan(datasets)
+    assert len(plan.new) == 3
+    assert not plan.changed and not plan.unchanged and not plan.removed
+
+
+@pytest.mark.asyncio
+async def test_sync(datasets, httpx_mock: HTTPXMock, tmp_path):
+    path = tmp_path / "sync.json"
+    for n in range(3):
+        httpx_mock.add_response(url=f"https://example.org/{n}.xml", content=b"<iati-activities />", headers={"etag": f'"{n}"'})
+
+    # First run: everything is new
+    async with DatasetCrawler(backoff=0) as crawler:
+        state = SyncState.load(path)
+        sync = DatasetSync(crawler, state)
+        plan = await sync.plan(datasets)
+        downloads = [d async for d in sync.run(plan, output=lambda d: f"out/{d.dataset.name}.json")]
+    assert len(downloads) == 3
+    state.save(path)
+
+    # Second run: one dataset changed, one was removed from the registry
+    changed, unchanged, removed = datasets
+    changed = changed.copy(update={"sha1": "0" * 40})
+    httpx_mock.add_response(url="https://example.org/0.xml", status_code=304, match_headers={"If-None-Match": '"0"'})
+
+    async with DatasetCrawler(backoff=0) as crawler:
+        state = SyncState.load(path)
+        sync = DatasetSync(crawler, state)
+        plan = await sync.plan([changed, unchanged])
+        assert [d.name for d in plan.changed] == [changed.name]
+        assert [d.name for d in plan.unchanged] == [unchanged.name]
+        assert [r.name for r in plan.removed] == [removed.name]
+
+        downloads = [d async for d in sync.run(plan, output=lambda d: "not called for unchanged content")]
+    assert [d.status_code for d in downloads] == [304]
+    assert set(state.records) == {changed.name, unchanged.name}
+    assert state.records[changed.name].sha1 == "0" * 40
+    assert state.records[changed.name].output == f"out/{changed.name}.json"
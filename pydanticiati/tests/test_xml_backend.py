@@ -0,0 +1,70 @@
+from pathlib import Path
+
+import pytest
+import xml_backend
+from activity.models import IatiActivities, IatiActivity
+from codelists.models import Codelist
+
+sample = Path("pydanticiati") / "data" / "sample"
+
+
+@pytest.fixture
+def backend():
+    """
+    Restore the default backend after a test switches it
+    """
+    default = xml_backend.name
+    yield
+    xml_backend.use(default)
+
+
+def parse_with(backend_name: str, model, path: Path):
+    xml_backend.use(backend_name)
+    return model.from_file(path)
+
+
+@pytest.mark.parametrize("path", ["activity-standard-example-annotated.xml", "111111_publisher-activities.xml"])
+def test_backends_give_identical_activities(backend, path):
+    pytest.importorskip("lxml")
+    assert parse_with(xml_backend.LXML, IatiActivities, sample / path) == parse_with(xml_backend.ETREE, IatiActivities, sample / path)
+
+
+def test_backends_give_identical_codelists(backend):
+    pytest.importorskip("lxml")
+    path = sample / "CRSChannelCode.xml"
+    assert parse_with(xml_backend.LXML, Codelist, path) == parse_with(xml_backend.ETREE, Codelist, path)
+
+
+@pytest.mark.parametrize("backend_name", [xml_backend.ETREE, xml_backend.LXML])
+def test_backend_streaming(backend, backend_name):
+    if backend_name == xml_backend.LXML:
+        pytest.importorskip("lxml")
+    xml_backend.use(backend_name)
+    path = sample / "111111_publisher-activities.xml"
+    stream = IatiActivities.iter_file(path)
+    assert stream.header.version == "2.02"
+    assert list(stream) == IatiActivities.from_file(path).iati_activity
+
+
+def test_unknown_backend(backend):
+    with pytest.raises(ValueError):
+        xml_backend.use("minidom")
+
+
+@pytest.mark.parametrize("backend_name", [xml_backend.ETREE, xml_backend.LXML])
+def test_child_parser(backend, backend_name):
+    if backend_name == xml_backend.LXML:
+        pytest.importorskip("lxml")
+    xml_backend.use(backend_name)
+    content = (sample / "111111_publisher-activities.xml").read_bytes()
+    parser = xml_backend.ChildParser("iati-activity")
+    elements = []
+    for start in range(0, len(content), 100):
+        elements.extend(parser.feed(content[start : start + 100]))
+    elements.extend(parser.close())
+
+    root, *activities = elements
+    assert root.tag == "iati-activities"
+    assert root.get("version") == "2.02"
+    assert len(root) == 0
+    assert [IatiActivity.from_element(element) for element in activities] == IatiActivities.from_file(sample / "111111_publisher-activities.xml").iati_activity
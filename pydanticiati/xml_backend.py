@@ -0,0 +1,212 @@
+"""
+The XML library used to parse and serialize models.
+
+lxml is used when it is installed, falling back to the standard library's
+ElementTree otherwise. Set the `PYDANTICIATI_XML_BACKEND` environment variable
+to "lxml" or "etree", or call `use`, to choose explicitly.
+
+Both backends produce identical models. Serialized output is equivalent
+but not byte-identical: lxml writes empty elements as `<a/>` where ElementTree writes `<a />`.
+"""
+from __future__ import annotations
+
+import os
+import xml.etree.ElementTree as ElementTree
+from typing import IO, Any, Dict, Iterator, List, Optional, Union
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:  # pragma: no cover
+    lxml_etree = None
+
+LXML = "lxml"
+ETREE = "etree"
+
+Source = Union[str, os.PathLike, IO[bytes]]
+
+# The active backend: its name, and the matching `etree` module
+name = ETREE
+etree: Any = ElementTree
+
+
+def use(backend: str):
+    """
+    Select the XML backend: "lxml" or "etree"
+    """
+    global name, etree
+    if backend == LXML:
+        if lxml_etree is None:
+            raise ImportError("lxml is not installed")
+        etree = lxml_etree
+    elif backend == ETREE:
+        etree = ElementTree
+    else:
+        raise ValueError(f"Unknown XML backend {backend}, expected one of {LXML}, {ETREE}")
+    name = backend
+
+
+def _lxml_parser():
+    # Match ElementTree, which drops comments and processing instructions
+    return lxml_etree.XMLParser(remove_comments=True, remove_pis=True, resolve_entities=False, huge_tree=True)
+
+
+def _is_lxml(element: Any) -> bool:
+    return lxml_etree is not None and isinstance(element, lxml_etree._Element)
+
+
+def _fspath(source: Source) -> Union[str, IO[bytes]]:
+    return os.fspath(source) if isinstance(source, os.PathLike) else source
+
+
+def parse(source: Source):
+    """
+    Parse a file, returning the root element
+    """
+    if name == LXML:
+        return lxml_etree.parse(_fspath(source), _lxml_parser()).getroot()
+    return ElementTree.parse(source).getroot()
+
+
+def root_tag(path: Union[str, os.PathLike]) -> str:
+    """
+    The tag of a file's root element, reading no more of the file than needed
+    """
+    with open(path, "rb") as source:
+        _, root = next(etree.iterparse(source, events=("start",)))
+        return root.tag
+
+
+def fromstring(content: Union[str, bytes]):
+    if name == LXML:
+        return lxml_etree.fromstring(content, _lxml_parser())
+    return ElementTree.fromstring(content)
+
+
+def Element(tag: str, attrib: Optional[Dict[str, str]] = None):
+    return etree.Element(tag, attrib or {})
+
+
+def SubElement(parent: Any, tag: str):
+    if _is_lxml(parent):
+        return lxml_etree.SubElement(parent, tag)
+    return ElementTree.SubElement(parent, tag)
+
+
+def tostring(element: Any, encoding: str = "us-ascii", xml_declaration: Optional[bool] = None) -> bytes:
+    """
+    Serialize an element from either backend.
+    As with both backends, by default there is an XML declaration
+    only for encodings other than us-ascii and utf-8
+    """
+    if _is_lxml(element):
+        return lxml_etree.tostring(element, encoding=encoding, xml_declaration=xml_declaration)
+    return ElementTree.tostring(element, encoding=encoding, xml_declaration=xml_declaration)
+
+
+def getpath(element: Any) -> Optional[str]:
+    """
+    The XPath of an lxml element; None for an ElementTree element, which doesn't know its parents
+    """
+    if _is_lxml(element):
+        return element.getroottree().getpath(element)
+    return None
+
+
+def iterchildren(source: Source, tag: str) -> Iterator:
+    """
+    Incrementally parse `source`. This yields the root element first
+    (with its attributes, though its content may not have been parsed yet)
+    and then each `tag` child of the root once it is complete.
+    Children are dropped from the tree once the caller is finished with them.
+    """
+    if name == LXML:
+        return _lxml_iterchildren(source, tag)
+    return _etree_iterchildren(source, tag)
+
+
+def _etree_iterchildren(source: Source, tag: str) -> Iterator:
+    events = ElementTree.iterparse(source, events=("start", "end"))
+    _, root = next(events)
+    yield root
+    depth = 1
+    for event, element in events:
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            continue
+        if element.tag == tag:
+            yield element
+        # Everything under the root up to here is finished with
+        del root[:]
+
+
+def _lxml_iterchildren(source: Source, tag: str) -> Iterator:
+    # lxml filters events by tag in C, so only `tag` elements reach Python
+    events = lxml_etree.iterparse(
+        _fspath(source), events=("start", "end"), tag=tag, remove_comments=True, remove_pis=True, resolve_entities=False, huge_tree=True
+    )
+    root = None
+    for event, element in events:
+        parent = element.getparent()
+        if root is None and parent is not None:
+            root = parent
+            yield root
+        if event != "end" or parent is not root:
+            continue
+        yield element
+        element.clear()
+        while element.getprevious() is not None:
+            del root[0]
+    if root is None:
+        # The document has no `tag` children at all
+        yield events.root
+
+
+class ChildParser:
+    """
+    The push counterpart of `iterchildren`, for data arriving in chunks (over the network, say).
+    Each call to `feed` returns the elements completed by that chunk: the root element first
+    (with its attributes), then each complete `tag` child of the root.
+    Children are detached from the root as they are returned.
+    """
+
+    def __init__(self, tag: str):
+        self.tag = tag
+        if name == LXML:
+            self._parser = lxml_etree.XMLPullParser(events=("start", "end"), remove_comments=True, remove_pis=True, resolve_entities=False, huge_tree=True)
+        else:
+            self._parser = ElementTree.XMLPullParser(events=("start", "end"))
+        # An element of either backend, once the root's start tag has been read
+        self.root: Any = None
+        self._depth = 0
+
+    def feed(self, data: bytes) -> List:
+        self._parser.feed(data)
+        return self._read()
+
+    def close(self) -> List:
+        self._parser.close()
+        return self._read()
+
+    def _read(self) -> List:
+        elements = []
+        for event, element in self._parser.read_events():
+            if event == "start":
+                self._depth += 1
+                if self.root is None:
+                    self.root = element
+                    elements.append(element)
+                continue
+            self._depth -= 1
+            if self._depth != 1:
+                continue
+            if element.tag == self.tag:
+                elements.append(element)
+            # Everything under the root up to here is finished with
+            del self.root[:]
+        return elements
+
+
+use(os.environ.get("PYDANTICIATI_XML_BACKEND", LXML if lxml_etree is not None else ETREE))